@@ -1,19 +1,13 @@
-import os
-import sys
-
-# SAFE FIX: Only runs if pysqlite3 is installed (Deployed Envs)
-try:
-    __import__('pysqlite3')
-    sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-except ImportError:
-    pass  # Skips this on your local Mac so it doesn't crash
-
 import streamlit as st
-# ... rest of your imports ...
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.vectorstores import Chroma
+from google.api_core.exceptions import ResourceExhausted
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from omni.ingest import load_pdfs_parallel
+from omni.llm import generate, get_embeddings, stream
+from omni.mapreduce import map_reduce
+from omni.metrics import set_context
+from omni.pdf import extract_text_cached
+from omni.retry import rate_limit_message
+from omni.vectorstore import NumpyVectorStore
 
 # --- 1. CONFIGURATION & STYLE ---
 st.set_page_config(page_title="Omni-Agent Platform",
@@ -58,18 +52,32 @@ st.markdown("""
 
 
 def get_gemini_response(api_key, prompt, temp=0.3):
-    os.environ["GOOGLE_API_KEY"] = api_key
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=temp)
-    response = llm.invoke(prompt)
-    return response.content
+    # Identical prompts (same resume, same JD) come straight from the cache.
+    # Returns None (after a warning) when rate limited.
+    try:
+        return generate(api_key, prompt, model="gemini-2.5-flash", temperature=temp)
+    except ResourceExhausted as e:
+        # Includes CoolingDown / Throttled: the quota is spent for now
+        st.warning(rate_limit_message(e))
+        return None
+
+
+def stream_gemini_response(api_key, prompt, temp=0.3):
+    # Renders tokens as they arrive and returns the full text at the end,
+    # or None (after a warning) when rate limited
+    try:
+        return st.write_stream(
+            stream(api_key, prompt, model="gemini-2.5-flash", temperature=temp))
+    except ResourceExhausted as e:
+        # Raised before the first token, or mid-stream if the quota runs out
+        st.warning(rate_limit_message(e))
+        return None
 
 
 def extract_text_from_pdf(uploaded_file):
-    with open("temp_pdf.pdf", "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    loader = PyPDFLoader("temp_pdf.pdf")
-    docs = loader.load()
-    return "\n".join([page.page_content for page in docs])
+    # Parsed straight from the upload buffer, and only once per distinct file:
+    # reruns with the same upload cost a SHA-256 instead of a full parse
+    return extract_text_cached(uploaded_file)
 
 
 # --- 3. SESSION STATE ---
@@ -99,6 +107,8 @@ with st.sidebar:
         ["Gap Analysis", "App Generator", "Ops Intelligence", "Research Synth"],
         label_visibility="collapsed"
     )
+    # Every model call made this run is attributed to the selected module
+    set_context(module=mode)
 
     st.markdown("---")
 
@@ -177,10 +187,9 @@ if mode == "Gap Analysis":
                 * (How to fix the gaps and remove the AI-sounding fluff)
                 """
 
-                result = get_gemini_response(api_key, prompt)
-                status.update(label="Analysis Complete",
-                              state="complete", expanded=False)
-            st.markdown(result)
+            stream_gemini_response(api_key, prompt)
+            status.update(label="Analysis Complete",
+                          state="complete", expanded=False)
         else:
             st.error("Action Required: Upload Resume and JD in the Sidebar.")
 
@@ -193,10 +202,9 @@ elif mode == "App Generator":
     if st.button("Generate Application Package", type="primary", use_container_width=True):
         if st.session_state.resume_text and st.session_state.job_desc_text:
             tab1, tab2 = st.tabs(["Optimized Resume", "Cover Letter"])
-            with st.status("Drafting Documents...", expanded=True) as status:
 
-                # RESUME
-                st.write("Optimizing for ATS keywords...")
+            # Each document streams straight into its own tab
+            with tab1:
                 resume_prompt = f"""
                 Role: Expert Resume Writer. Task: Rewrite resume to align with JD.
                 Constraints: 
@@ -205,29 +213,22 @@ elif mode == "App Generator":
                 - Use JD keywords naturally.
                 RESUME: {st.session_state.resume_text} JD: {st.session_state.job_desc_text}
                 """
-                new_resume = get_gemini_response(
+                new_resume = stream_gemini_response(
                     api_key, resume_prompt, temp=0.5)
-
-                # COVER LETTER
-                st.write("Drafting executive letter...")
+                if new_resume:
+                    st.download_button("Download Resume (.md)",
+                                       new_resume, use_container_width=True)
+            with tab2:
                 cl_prompt = f"""
                 Role: Executive Coach. Task: Write a cover letter connecting user achievements to company pain points.
                 Constraints: Direct, professional, no fluff.
                 RESUME: {st.session_state.resume_text} JD: {st.session_state.job_desc_text}
                 """
-                cover_letter = get_gemini_response(
+                cover_letter = stream_gemini_response(
                     api_key, cl_prompt, temp=0.5)
-                status.update(label="Generation Complete",
-                              state="complete", expanded=False)
-
-            with tab1:
-                st.markdown(new_resume)
-                st.download_button("Download Resume (.md)",
-                                   new_resume, use_container_width=True)
-            with tab2:
-                st.markdown(cover_letter)
-                st.download_button("Download Letter (.md)",
-                                   cover_letter, use_container_width=True)
+                if cover_letter:
+                    st.download_button("Download Letter (.md)",
+                                       cover_letter, use_container_width=True)
         else:
             st.error("Action Required: Upload Resume and JD in the Sidebar.")
 
@@ -245,24 +246,32 @@ elif mode == "Ops Intelligence":
             if st.button("Index Docs", use_container_width=True):
                 if manuals:
                     with st.status("Indexing Vector Database...", expanded=True) as status:
-                        all_docs = []
-                        for f in manuals:
-                            with open(f"temp_{f.name}", "wb") as file:
-                                file.write(f.getbuffer())
-                            all_docs.extend(PyPDFLoader(
-                                f"temp_{f.name}").load())
-                            os.remove(f"temp_{f.name}")
+                        # Extract every manual in parallel across CPU cores
+                        def report(name, pages, error):
+                            if error:
+                                st.write(f"❌ {name}: {error}")
+                            else:
+                                st.write(f"✅ {name} ({pages} pages)")
+
+                        all_docs = load_pdfs_parallel(
+                            [(f.name, f.getvalue()) for f in manuals], on_progress=report)
                         splitter = RecursiveCharacterTextSplitter(
                             chunk_size=1000, chunk_overlap=100)
                         chunks = splitter.split_documents(all_docs)
-                        embeddings = GoogleGenerativeAIEmbeddings(
-                            model="models/text-embedding-004", google_api_key=api_key)
-                        st.session_state.ops_db = Chroma.from_documents(
-                            chunks, embeddings)
-                        status.update(label="Indexing Complete",
-                                      state="complete", expanded=False)
-                        st.success(
-                            f"Knowledge Base Active: {len(chunks)} vectors stored.")
+                        embeddings = get_embeddings(api_key)
+                        try:
+                            # In-memory NumPy store: one matrix, no SQLite
+                            st.session_state.ops_db = NumpyVectorStore.from_documents(
+                                chunks, embeddings)
+                        except ResourceExhausted as e:
+                            # Embedded batches are cached, so a retry resumes cheaply
+                            status.update(label="Rate Limited", state="error", expanded=True)
+                            st.warning(rate_limit_message(e))
+                        else:
+                            status.update(label="Indexing Complete",
+                                          state="complete", expanded=False)
+                            st.success(
+                                f"Knowledge Base Active: {len(chunks)} vectors stored.")
 
     st.divider()
     query = st.text_input("Operational Query",
@@ -270,11 +279,16 @@ elif mode == "Ops Intelligence":
 
     if st.button("Execute Search", type="primary", use_container_width=True):
         if st.session_state.ops_db and query:
-            results = st.session_state.ops_db.similarity_search(query, k=3)
+            try:
+                results = st.session_state.ops_db.similarity_search(query, k=3)
+            except ResourceExhausted as e:
+                # The query embedding could not get rate-limit budget
+                st.warning(rate_limit_message(e))
+                st.stop()
             context = "\n".join([d.page_content for d in results])
-            ans = get_gemini_response(
+            st.markdown("### Answer")
+            stream_gemini_response(
                 api_key, f"Context: {context} \n Question: {query}")
-            st.markdown(f"### Answer \n {ans}")
             with st.expander("View Source Context"):
                 for doc in results:
                     st.caption(doc.page_content[:300] + "...")
@@ -290,10 +304,17 @@ elif mode == "Research Synth":
 
     if st.button("Synthesize Insights", type="primary", use_container_width=True):
         if transcripts:
-            with st.status("Analyzing Data Patterns...", expanded=True):
-                text = ""
-                for f in transcripts:
-                    text += extract_text_from_pdf(f)
-                res = get_gemini_response(
-                    api_key, f"Analyze patterns and generate executive summary: {text}")
-            st.markdown(res)
+            goal = "Analyze patterns and generate executive summary"
+            with st.status("Analyzing Data Patterns...", expanded=True) as status:
+                # Map-reduce: parts are summarized in parallel, then merged
+                try:
+                    summaries = map_reduce(
+                        api_key, ((f.name, extract_text_from_pdf(f)) for f in transcripts),
+                        goal, on_progress=lambda message: status.update(label=message))
+                except ResourceExhausted as e:
+                    summaries = None
+                    st.warning(rate_limit_message(e))
+                status.update(state="complete" if summaries else "error", expanded=False)
+            if summaries:
+                stream_gemini_response(
+                    api_key, f"{goal}: " + "\n\n---\n\n".join(summaries))
@@ -1,11 +1,22 @@
 from google.api_core.exceptions import ResourceExhausted
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
+from omni.context import RETRIEVE_K, pack_context
+from omni.llm import generate, stream
+from omni.mapreduce import map_reduce
+from omni.metrics import bind, get_metrics_log, percentile, set_context, summary
+from omni.pdf import extract_text_cached
+from omni.profile import compact_views
+from omni.ratelimit import get_rate_limiter
+from omni.retry import get_retry_scheduler, rate_limit_message
+from omni.screening import gap_analysis_prompt, screen
+from omni.stench import analyze, format_facts
+from omni.sop_index import collection_name, list_collections, search, upsert_sources
+from omni.tracing import collect, enable, is_enabled, span
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import time
 import json
+import queue
 import streamlit as st
 import os
 import sys
@@ -126,54 +137,209 @@ def get_average_rating():
 # AI FUNCTIONS
 
 
-def get_gemini_response(api_key, prompt, temp=0.3):
-    # Initialize usage counter if not exists
-    if "api_usage_count" not in st.session_state:
-        st.session_state.api_usage_count = 0
+MAX_RETRIES = 3
+DEMO_LIMIT_MESSAGE = "⚠️ **DEMO LIMIT REACHED** ⚠️\n\nThe AI is currently overloaded. Please wait 60 seconds and try again."
+
+
+def should_run(action, clicked):
+    """True when the action's button was clicked, or its scheduled retry is due.
+
+    A rate-limited action is not retried with sleeps; instead it's booked in
+    st.session_state.retry and the countdown fragment reruns the app when the
+    wait is over. This lets the module pick up where it left off.
+    """
+    pending = st.session_state.retry
+    if clicked:
+        st.session_state.retry = None  # Fresh click, fresh retry budget
+    elif not (pending and pending["action"] == action and time.time() >= pending["at"]):
+        return False
+    st.session_state.current_action = action
+    set_context(retry=0 if clicked else pending["attempt"])
+    return True
+
+
+@st.fragment(run_every=1)
+def retry_countdown():
+    # Reruns on its own every second; only this fragment redraws, not the page
+    pending = st.session_state.retry
+    if not pending:
+        return
+    remaining = pending["at"] - time.time()
+    if remaining > 0:
+        st.warning(
+            f"⚠️ High Traffic. Retrying in {int(remaining) + 1} seconds... (Attempt {pending['attempt']}/{MAX_RETRIES - 1})")
+    else:
+        st.rerun()  # Full rerun: should_run() sees the due retry
+
+
+def handle_rate_limit(error):
+    """Books a non-blocking retry of the current action.
+
+    Returns None when a retry is scheduled (the countdown is shown in place of
+    the answer), or the demo-limit message once the retry budget is spent.
+    """
+    pending = st.session_state.retry or {}
+    attempt = pending.get("attempt", 0)
+    if attempt >= MAX_RETRIES - 1:
+        st.session_state.retry = None
+        return DEMO_LIMIT_MESSAGE
+
+    delay = get_retry_scheduler().delay_for(attempt, error)
+    st.session_state.retry = {
+        "module": mode,
+        "action": st.session_state.current_action,
+        "at": time.time() + delay,
+        "attempt": attempt + 1,
+    }
+    if not countdown_shown:
+        retry_countdown()
+    return None
 
-    os.environ["GOOGLE_API_KEY"] = api_key
 
-    # --- SMART EXPONENTIAL BACKOFF WITH VISUAL COUNTDOWN ---
-    max_retries = 3
-    base_delay = 5  # Start with 5 seconds
+def get_gemini_response(api_key, prompt, temp=0.3):
+    """Returns the answer, or None if the call was rescheduled after a 429."""
+    try:
+        # Cache hits return instantly and never reach the API
+        text = generate(api_key, prompt,
+                        model="gemini-2.5-flash", temperature=temp)
+    except ResourceExhausted as e:
+        # Includes CoolingDown: another session just hit the limit
+        return handle_rate_limit(e)
+    except Exception as e:
+        return f"⚠️ **SYSTEM ERROR:** {str(e)}"
+
+    st.session_state.retry = None
+    return text
+
+
+def stream_gemini_response(api_key, prompt, temp=0.3):
+    """Writes the answer into the page token by token and returns the full text.
+
+    Users see the first words after one round-trip instead of waiting for the
+    whole completion. Cached answers appear at once. Returns None if the call
+    was rescheduled after a 429.
+    """
+    chunks = stream(api_key, prompt, model="gemini-2.5-flash", temperature=temp)
+    try:
+        # Rate-limit errors usually surface on the first chunk, before anything is drawn
+        first = next(chunks, "")
+    except ResourceExhausted as e:
+        text = handle_rate_limit(e)
+        if text:
+            st.markdown(text)
+        return text
+    except Exception as e:
+        text = f"⚠️ **SYSTEM ERROR:** {str(e)}"
+        st.markdown(text)
+        return text
+
+    def rest():
+        yield first
+        yield from chunks
 
-    for attempt in range(max_retries):
+    try:
+        text = st.write_stream(rest())
+    except ResourceExhausted as e:
+        # Quota ran out mid-answer: the partial text stays, the action is rebooked
+        text = handle_rate_limit(e)
+        if text:
+            st.markdown(text)
+        return text
+    except Exception as e:
+        text = f"⚠️ **SYSTEM ERROR:** {str(e)}"
+        st.markdown(text)
+        return text
+    st.session_state.retry = None
+    return text
+
+
+def generate_in_parallel(api_key, jobs, on_progress=None):
+    """Runs independent prompts at the same time.
+
+    jobs maps a name to (prompt, temp). Yields (name, text) as each one
+    finishes, so total wait is the slowest call instead of the sum.
+    on_progress(name, text_so_far) is called as tokens stream in. Jobs that
+    were rate limited are not yielded if a retry of the action was scheduled.
+    """
+    updates = queue.Queue()
+
+    @bind
+    def worker(name, prompt, temp):
         try:
-            # Increment Counter
-            st.session_state.api_usage_count += 1
-
-            llm = ChatGoogleGenerativeAI(
-                model="gemini-2.5-flash", temperature=0.3)
-            response = llm.invoke(prompt)
-            return response.content
-
-        except ResourceExhausted:
-            # If we hit the limit...
-            if attempt < max_retries - 1:
-                wait_time = base_delay * (2 ** attempt)
-
-                # --- VISUAL COUNTDOWN LOGIC ---
-                placeholder = st.empty()  # Create a placeholder to update
-                for i in range(wait_time, 0, -1):
-                    placeholder.warning(
-                        f"⚠️ High Traffic. Retrying in {i} seconds... (Attempt {attempt+1}/{max_retries})")
-                    time.sleep(1)
-                placeholder.empty()  # Clear the message
-                # ------------------------------
-
+            for chunk in stream(api_key, prompt, model="gemini-2.5-flash", temperature=temp):
+                updates.put((name, chunk, None))
+            updates.put((name, None, None))
+        except Exception as e:
+            updates.put((name, None, e))
+
+    rate_limited = []
+
+    # Worker threads only talk to the API; all Streamlit calls stay on this thread
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        for name, (prompt, temp) in jobs.items():
+            pool.submit(worker, name, prompt, temp)
+
+        texts = {name: "" for name in jobs}
+        remaining = len(jobs)
+        while remaining:
+            name, chunk, error = updates.get()
+            if chunk is not None:
+                texts[name] += chunk
+                if on_progress:
+                    on_progress(name, texts[name])
                 continue
+
+            remaining -= 1
+            if error is None:
+                yield name, texts[name]
+            elif isinstance(error, ResourceExhausted):
+                rate_limited.append((name, error))
             else:
-                return "⚠️ **DEMO LIMIT REACHED** ⚠️\n\nThe AI is currently overloaded. Please wait 60 seconds and try again."
-        except Exception as e:
-            return f"⚠️ **SYSTEM ERROR:** {str(e)}"
+                yield name, f"⚠️ **SYSTEM ERROR:** {str(error)}"
+
+    if not rate_limited:
+        st.session_state.retry = None
+        return
+
+    # One retry for the whole action; finished jobs come back from the cache
+    message = handle_rate_limit(rate_limited[0][1])
+    if message:
+        for name, _ in rate_limited:
+            yield name, message
+
+
+@st.fragment(run_every=5)
+def system_load():
+    st.caption("⚡ SYSTEM LOAD (LIVE)")
+    load = get_rate_limiter("chat").snapshot()
+
+    # Share of the per-minute budget spent right now (refills continuously)
+    rpm_pct = min(load["requests_used"] / load["rpm"], 1.0)
+    tpm_pct = min(load["tokens_used"] / load["tpm"], 1.0)
+    st.progress(rpm_pct, text=f"{load['requests_used']:.0f} / {load['rpm']} requests/min")
+    st.progress(tpm_pct, text=f"{load['tokens_used'] / 1000:.0f}k / {load['tpm'] / 1000:.0f}k tokens/min")
+
+    if load["waiting"]:
+        st.caption(f"⏳ {load['waiting']} request(s) queued")
+    if max(rpm_pct, tpm_pct) >= 0.9:
+        st.warning("⚠️ High Traffic - System may slow down")
 
 
 def extract_text_from_pdf(uploaded_file):
-    with open("temp_pdf.pdf", "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    loader = PyPDFLoader("temp_pdf.pdf")
-    docs = loader.load()
-    return "\n".join([page.page_content for page in docs])
+    # Parsed straight from the upload buffer, and only once per distinct file:
+    # reruns with the same upload cost a SHA-256 instead of a full parse
+    return extract_text_cached(uploaded_file)
+
+
+def show_trace(trace, key):
+    """Stage timings of the action that just ran (only while tracing is on, see Perf)."""
+    if not is_enabled() or not trace.events():
+        return
+    with st.expander("⏱️ Stage Breakdown"):
+        st.dataframe(trace.breakdown(), use_container_width=True, hide_index=True)
+        st.download_button("Download Trace (Perfetto / chrome://tracing)",
+                           data=json.dumps(trace.chrome_trace()), file_name=f"{key}.json",
+                           mime="application/json", key=key)
 
 
 # --- 3. SESSION STATE ---
@@ -181,12 +347,17 @@ if "resume_text" not in st.session_state:
     st.session_state.resume_text = None
 if "job_desc_text" not in st.session_state:
     st.session_state.job_desc_text = None
-if "ops_db" not in st.session_state:
-    st.session_state.ops_db = None
+# Name of the persisted SOP collection this session is querying
+if "sop_collection" not in st.session_state:
+    st.session_state.sop_collection = None
 if "feedback_submitted" not in st.session_state:
     st.session_state.feedback_submitted = False
-if "api_usage_count" not in st.session_state:
-    st.session_state.api_usage_count = 0
+
+# Pending non-blocking retry: {"module", "action", "at", "attempt"} or None
+if "retry" not in st.session_state:
+    st.session_state.retry = None
+if "current_action" not in st.session_state:
+    st.session_state.current_action = None
 
 # Store generated docs in session state so edits persist
 if "gen_resume" not in st.session_state:
@@ -208,26 +379,10 @@ with st.sidebar:
         else:
             api_key = st.text_input("API Key", type="password")
 
-    # --- NEW: USAGE TRACKER ---
+    # --- LIVE LOAD METER (shared by every session on this server) ---
     if api_key:
         st.markdown("---")
-        st.caption("⚡ SYSTEM LOAD (DEMO)")
-
-        # Free Tier Limit is roughly 15 RPM.
-        usage = st.session_state.api_usage_count
-        limit = 15
-
-        # Calculate percentage for progress bar (cap at 100%)
-        pct = min(usage / limit, 1.0)
-
-        st.progress(pct, text=f"{usage} / {limit} Load Units")
-
-        if usage >= limit:
-            st.warning("⚠️ High Traffic - System may slow down")
-
-        if st.button("Reset Counter", help="Click this to reset usage count for a new demo"):
-            st.session_state.api_usage_count = 0
-            st.rerun()
+        system_load()
     # --------------------------
 
     st.markdown("---")
@@ -237,9 +392,11 @@ with st.sidebar:
     mode = st.radio(
         "Navigation",
         ["Gap Analysis", "Doc. Generator",
-            "SOP Search", "Pattern Finder", "Feedback"],
+            "SOP Search", "Pattern Finder", "Feedback", "Perf"],
         label_visibility="collapsed"
     )
+    # Every model call made this run is attributed to the selected module
+    set_context(module=mode, retry=0)
 
     st.markdown("---")
 
@@ -277,78 +434,137 @@ if not api_key:
 
 # --- 5. MAIN CONTENT AREA ---
 
+# A retry belongs to the module that booked it: switching modules cancels it,
+# so the queued action can't fire later without a click.
+if st.session_state.retry and st.session_state.retry["module"] != mode:
+    st.session_state.retry = None
+
+# A booked retry keeps its countdown on screen whatever else reruns the page.
+# Once it's due, this run is the retry itself: should_run() picks it up and
+# the countdown must not fire another rerun.
+countdown_shown = bool(st.session_state.retry) and st.session_state.retry["at"] > time.time()
+if countdown_shown:
+    retry_countdown()
+
 # MODULE 1: GAP ANALYSIS (RESTORED PROMPT)
 if mode == "Gap Analysis":
     st.subheader("Strategic Gap Analysis")
     st.caption("Evaluate candidate fit and authenticity against target role.")
 
-    if st.button("Execute Gap Analysis", type="primary", use_container_width=True):
+    clicked = st.button("Execute Gap Analysis", type="primary", use_container_width=True)
+    if should_run("gap_analysis", clicked):
         if st.session_state.resume_text and st.session_state.job_desc_text:
             with st.status("Analyzing Candidate Profile...", expanded=True) as status:
                 st.write("Parsing resume architecture...")
-                st.write("Detecting AI generation patterns...")
+                # Structured profiles are extracted once per document, then cached
+                resume_view, jd_view = compact_views(
+                    api_key, st.session_state.resume_text, st.session_state.job_desc_text)
+                # Buzzword scan and style stats run locally; the model gets the facts
+                stench = analyze(st.session_state.resume_text)
+                st.write(f"Detecting AI generation patterns... local Human Score "
+                         f"{stench['human_score']}% ({len(stench['hits'])} flagged phrases)")
                 st.write("Mapping skills to requirements...")
 
-                prompt = f"""
-                Act as a ruthless Executive Recruiter and AI Detector. 
-                
-                TASK:
-                1. Compare the Resume against the JD.
-                2. Analyze the Resume for "AI Stench" (patterns that scream ChatGPT-written).
-                
-                RESUME: 
-                {st.session_state.resume_text}
-                
-                JD: 
-                {st.session_state.job_desc_text}
-                
-                OUTPUT FORMAT (Markdown):
-                
-                ### 1. 🤖 Authenticity Check (THE MOST IMPORTANT SECTION)
-                * **Human Score:** (0-100% - Be brutal. 100% = Purely Human, 0% = Copy/Pasted from ChatGPT).
-                * **Verdict:** (e.g., "Authentic Professional", "Hybrid", or "Lazy AI Gen").
-                * **Red Flags:** List specific words/phrases that sound robotic (e.g., "delved", "tapestry", "unlocked", "spearheaded", "orchestrated"). If it sounds authentic, praise the specific human details.
-                
-                ### 2. 🎯 Match Score
-                * **Score:** (0-100%)
-                * **Summary:** One brutal sentence on if they get the interview.
-                
-                ### 3. ⚠️ Critical Gaps
-                * (Bullet points of missing skills required by the JD)
-                
-                ### 4. 💡 Strategic Advice
-                * (How to fix the gaps and remove the AI-sounding fluff)
-                """
-
-                result = get_gemini_response(api_key, prompt)
+                prompt = gap_analysis_prompt(resume_view, jd_view, format_facts(stench))
+
+            # Stream the report below the status block as it is generated
+            if stream_gemini_response(api_key, prompt) is None:
+                status.update(label="Waiting for API capacity...",
+                              state="running", expanded=False)
+            else:
                 status.update(label="Analysis Complete",
                               state="complete", expanded=False)
-            st.markdown(result)
         else:
             st.error("Action Required: Upload Resume and JD in the Sidebar.")
 
+    # BATCH MODE: N resumes x M JDs, pre-scored locally, top candidates audited
+    with st.expander("Batch Screening (many resumes × many JDs)"):
+        batch_resumes = st.file_uploader(
+            "Resumes (PDF)", type="pdf", accept_multiple_files=True, key="batch_resumes")
+        batch_jds = st.file_uploader(
+            "Job Descriptions (TXT/PDF) — defaults to the saved JD", type=["txt", "pdf"],
+            accept_multiple_files=True, key="batch_jds")
+        top_n = st.slider("Full audits per JD (0 = local screening only)", 0, 10, 3)
+        batch_clicked = st.button("Screen Batch", use_container_width=True)
+
+    if should_run("batch_screen", batch_clicked):
+        jds = {f.name: (extract_text_from_pdf(f) if f.name.lower().endswith(".pdf")
+                        else f.getvalue().decode("utf-8", errors="ignore"))
+               for f in batch_jds or []}
+        if not jds and st.session_state.job_desc_text:
+            jds = {"Saved JD": st.session_state.job_desc_text}
+        if batch_resumes and jds:
+            with st.status("Screening candidates...", expanded=True) as status:
+                resumes = {f.name: extract_text_from_pdf(f) for f in batch_resumes}
+                try:
+                    table = screen(api_key, resumes, jds, top_n=top_n,
+                                   on_progress=lambda message: status.update(label=message))
+                except ResourceExhausted as e:
+                    # The pre-score embeddings could not get rate-limit budget
+                    table = None
+                    message = handle_rate_limit(e)
+                    if message:
+                        st.markdown(message)
+                status.update(label="Screening Complete" if table is not None else "Rate Limited",
+                              state="complete" if table is not None else "error", expanded=False)
+            if table is not None:
+                st.session_state.retry = None
+                st.dataframe(table.drop(columns="audit"), use_container_width=True, hide_index=True)
+                st.download_button("Download Ranked CSV", table.to_csv(index=False),
+                                   file_name="screening.csv", mime="text/csv")
+        else:
+            st.error("Action Required: Upload resumes and at least one JD.")
+
 # MODULE 2: DOC GENERATOR
 elif mode == "Doc. Generator":
     st.subheader("Automated Documentation")
     st.caption("Generate ATS-optimized resumes and cover letters.")
 
     # 1. GENERATE BUTTON
-    if st.button("Generate Documents", type="primary", use_container_width=True):
+    clicked = st.button("Generate Documents", type="primary", use_container_width=True)
+    if should_run("doc_generator", clicked):
         if st.session_state.resume_text and st.session_state.job_desc_text:
             with st.status("Drafting Documents...", expanded=True) as status:
 
+                # Compact structured profiles instead of the raw documents
+                resume_view, jd_view = compact_views(
+                    api_key, st.session_state.resume_text, st.session_state.job_desc_text)
+
                 # Resume Gen
-                resume_prompt = f"Role: Expert Resume Writer. Rewrite resume for JD. RESUME: {st.session_state.resume_text} JD: {st.session_state.job_desc_text}"
-                st.session_state.gen_resume = get_gemini_response(
-                    api_key, resume_prompt, temp=0.5)
+                resume_prompt = f"Role: Expert Resume Writer. Rewrite resume for JD. RESUME: {resume_view} JD: {jd_view}"
 
                 # Cover Letter Gen
-                cl_prompt = f"Role: Executive Coach. Write cover letter. RESUME: {st.session_state.resume_text} JD: {st.session_state.job_desc_text}"
-                st.session_state.gen_cover_letter = get_gemini_response(
-                    api_key, cl_prompt, temp=0.5)
-
-                status.update(label="Generation Complete",
-                              state="complete", expanded=False)
+                cl_prompt = f"Role: Executive Coach. Write cover letter. RESUME: {resume_view} JD: {jd_view}"
+
+                # Both prompts are independent, so draft them concurrently
+                st.write("Drafting resume and cover letter in parallel...")
+                labels = {"gen_resume": "Optimized resume",
+                          "gen_cover_letter": "Cover letter"}
+                jobs = {"gen_resume": (resume_prompt, 0.5),
+                        "gen_cover_letter": (cl_prompt, 0.5)}
+
+                # Live drafts, side by side, filled in as tokens arrive
+                preview_cols = st.columns(2)
+                previews = {}
+                for col, name in zip(preview_cols, jobs):
+                    with col:
+                        st.caption(labels[name])
+                        previews[name] = st.empty()
+
+                def show_progress(name, text):
+                    previews[name].markdown(text + "▌")
+
+                for name, text in generate_in_parallel(api_key, jobs, on_progress=show_progress):
+                    st.session_state[name] = text
+                    previews[name].markdown(text)
+                    st.write(f"✅ {labels[name]} ready")
+
+                if st.session_state.retry:
+                    status.update(label="Waiting for API capacity...",
+                                  state="running", expanded=True)
+                else:
+                    status.update(label="Generation Complete",
+                                  state="complete", expanded=False)
         else:
             st.error("Action Required: Upload Resume and JD in the Sidebar.")
 
@@ -401,39 +617,84 @@ elif mode == "SOP Search":
             manuals = st.file_uploader(
                 "Upload SOP Documents", type="pdf", accept_multiple_files=True, label_visibility="collapsed")
         with col2:
+            target = st.text_input(
+                "Collection", value=st.session_state.sop_collection or "sop",
+                label_visibility="collapsed", placeholder="Collection name")
+            sync = st.checkbox("Sync", value=True,
+                               help="Remove manuals that are not in this upload from the collection")
             if st.button("Index Docs", use_container_width=True):
                 if manuals:
                     with st.status("Indexing Vector Database...", expanded=True) as status:
-                        all_docs = []
-                        for f in manuals:
-                            with open(f"temp_{f.name}", "wb") as file:
-                                file.write(f.getbuffer())
-                            all_docs.extend(PyPDFLoader(
-                                f"temp_{f.name}").load())
-                            os.remove(f"temp_{f.name}")
+                        # Only new or changed manuals are parsed (in parallel)
+                        def report(name, pages, error):
+                            if error:
+                                st.write(f"❌ {name}: {error}")
+                            else:
+                                st.write(f"✅ {name} ({pages} pages)")
+
                         splitter = RecursiveCharacterTextSplitter(
                             chunk_size=1000, chunk_overlap=100)
-                        chunks = splitter.split_documents(all_docs)
-                        embeddings = GoogleGenerativeAIEmbeddings(
-                            model="models/text-embedding-004", google_api_key=api_key)
-                        st.session_state.ops_db = Chroma.from_documents(
-                            chunks, embeddings)
-                        status.update(label="Indexing Complete",
-                                      state="complete", expanded=False)
-                        st.success(
-                            f"Knowledge Base Active: {len(chunks)} vectors stored.")
+
+                        # Embeds only new/changed chunks; unchanged files cost one hash
+                        name = collection_name(target)
+                        with collect() as trace:
+                            try:
+                                stats = upsert_sources(
+                                    name, [(f.name, f.getvalue()) for f in manuals], splitter, api_key,
+                                    remove_missing=sync, on_progress=report)
+                            except ResourceExhausted as e:
+                                # Nothing was saved; the next click re-embeds only what's missing
+                                stats = None
+                                status.update(label="Rate Limited", state="error", expanded=True)
+                                st.warning(rate_limit_message(e))
+                        if stats:
+                            st.session_state.sop_collection = name
+                            st.write(
+                                f"{stats['files_changed']} changed, {stats['files_unchanged']} unchanged, "
+                                f"{stats['files_removed']} removed · +{stats['chunks_added']} / -{stats['chunks_deleted']} chunks")
+                            status.update(label="Indexing Complete",
+                                          state="complete", expanded=False)
+                            st.success(
+                                f"Knowledge Base '{name}' Active: {stats['chunks_total']} vectors stored.")
+                    show_trace(trace, "index_trace")
 
     st.divider()
+
+    # Pick any knowledge base on disk, including ones indexed by other users
+    collections = list_collections()
+    if collections:
+        current = st.session_state.sop_collection
+        st.session_state.sop_collection = st.selectbox(
+            "Knowledge Base", collections,
+            index=collections.index(current) if current in collections else 0)
+    else:
+        st.info("No knowledge bases yet. Upload SOPs and click Index Docs.")
+
     query = st.text_input("Operational Query",
                           placeholder="e.g., What is the closing procedure?")
 
-    if st.button("Execute Search", type="primary", use_container_width=True):
-        if st.session_state.ops_db and query:
-            results = st.session_state.ops_db.similarity_search(query, k=3)
-            context = "\n".join([d.page_content for d in results])
-            ans = get_gemini_response(
-                api_key, f"Context: {context} \n Question: {query}")
-            st.markdown(f"### Answer \n {ans}")
+    clicked = st.button("Execute Search", type="primary", use_container_width=True)
+    if should_run("sop_search", clicked):
+        if st.session_state.sop_collection and query:
+            with collect() as trace, span("sop_search"):
+                # Repeat questions skip both the query embedding and the vector search
+                try:
+                    results = search(st.session_state.sop_collection, api_key, query, k=RETRIEVE_K)
+                except ResourceExhausted as e:
+                    # The query embedding was throttled: book a retry like any other 429
+                    results = None
+                    message = handle_rate_limit(e)
+                    if message:
+                        st.markdown(message)
+                if results is not None:
+                    context, used = pack_context(results)
+                    st.markdown("### Answer")
+                    st.caption(f"Context: {used['tokens']}/{used['budget']} tokens from "
+                               f"{used['used']} of {used['chunks']} chunks "
+                               f"({used['merged']} merged, {used['duplicates']} duplicates dropped)")
+                    stream_gemini_response(
+                        api_key, f"Context: {context} \n Question: {query}")
+            show_trace(trace, "search_trace")
 
 # MODULE 4: PATTERN FINDER
 elif mode == "Pattern Finder":
@@ -444,15 +705,26 @@ elif mode == "Pattern Finder":
         transcripts = st.file_uploader(
             "Upload Transcripts/Logs", type="pdf", accept_multiple_files=True)
 
-    if st.button("Synthesize Insights", type="primary", use_container_width=True):
+    clicked = st.button("Synthesize Insights", type="primary", use_container_width=True)
+    if should_run("pattern_finder", clicked):
         if transcripts:
-            with st.status("Analyzing Data Patterns...", expanded=True):
-                text = ""
-                for f in transcripts:
-                    text += extract_text_from_pdf(f)
-                res = get_gemini_response(
-                    api_key, f"Analyze patterns and generate executive summary: {text}")
-            st.markdown(res)
+            goal = "Analyze patterns and generate executive summary"
+            with st.status("Analyzing Data Patterns...", expanded=True) as status:
+                # Map-reduce: transcripts are read one at a time and summarized
+                # in parallel parts, so any number of them fits in one prompt
+                try:
+                    summaries = map_reduce(
+                        api_key, ((f.name, extract_text_from_pdf(f)) for f in transcripts),
+                        goal, on_progress=lambda message: status.update(label=message))
+                except ResourceExhausted as e:
+                    summaries = None
+                    message = handle_rate_limit(e)
+                    if message:
+                        st.markdown(message)
+                status.update(state="complete" if summaries else "error", expanded=False)
+            if summaries:
+                stream_gemini_response(
+                    api_key, f"{goal}: " + "\n\n---\n\n".join(summaries))
 
 # MODULE 5: FEEDBACK
 elif mode == "Feedback":
@@ -553,3 +825,43 @@ elif mode == "Feedback":
                         st.markdown(
                             f"**Improve:** {item['improvement_feedback']}")
                         st.markdown(f"**Feature:** {item['feature_request']}")
+
+# MODULE 6: PERF (ADMIN)
+elif mode == "Perf":
+    st.subheader("Model Call Performance")
+    st.caption("Latency, tokens and cache hits for every Gemini call, per module.")
+
+    # Process-wide: spans are recorded for every session while this is on
+    tracing = st.toggle("Stage tracing (SOP Search)", value=is_enabled(),
+                        help="Adds a stage breakdown and a downloadable Perfetto trace to SOP Search")
+    if tracing != is_enabled():
+        enable(tracing)
+
+    metrics_log = get_metrics_log()
+    source = st.radio("Source", ["This server (live)", "Full log (all apps)"],
+                      horizontal=True, label_visibility="collapsed")
+    calls = metrics_log.recent() if source == "This server (live)" else metrics_log.read()
+
+    if not calls:
+        st.info("No model calls recorded yet. Run any module, then come back.")
+    else:
+        # Latency and tokens only count real API calls, not cache hits or errors
+        answered = [c for c in calls if c["cache"] != "hit" and not c["error"]]
+        wall = [c["wall_ms"] for c in answered]
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Calls", len(calls))
+        m2.metric("p50 / p95 Latency",
+                  f"{percentile(wall, 50) or 0:.0f} / {percentile(wall, 95) or 0:.0f} ms")
+        m3.metric("Cache Hit Rate",
+                  f"{sum(c['cache'] == 'hit' for c in calls) / len(calls):.0%}")
+        m4.metric("Tokens",
+                  f"{sum((c['input_tokens'] or 0) + (c['output_tokens'] or 0) for c in answered):,}")
+
+        st.markdown("**Per Module**")
+        st.dataframe(summary(calls), use_container_width=True, hide_index=True)
+
+        st.markdown("**Recent Calls**")
+        st.dataframe(list(reversed(calls[-200:])), use_container_width=True, hide_index=True)
+        st.download_button("Download Log (JSONL)",
+                           data="\n".join(json.dumps(c) for c in calls),
+                           file_name="llm_calls.jsonl", mime="application/json")
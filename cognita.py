@@ -1,24 +1,14 @@
 import os
-import sys
-
-# --- STRATEGIC FIX FOR STREAMLIT CLOUD ---
-# ChromaDB requires a newer version of SQLite than what Streamlit Cloud provides.
-# This code swaps the system's default sqlite3 with the 'pysqlite3-binary' we installed.
-try:
-    __import__('pysqlite3')
-    sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-except ImportError:
-    # This handles your local Mac environment where pysqlite3 might not be installed
-    # because Macs usually have a modern enough SQLite by default.
-    pass
 
 import streamlit as st
-# ... rest of your imports (chromadb, etc.) follow here ...
 import pandas as pd
-import google.generativeai as genai
 from io import BytesIO
+from google.api_core.exceptions import ResourceExhausted
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import LETTER
+from omni.llm import generate
+from omni.metrics import set_context
+from omni.retry import rate_limit_message
 
 # 1. Page Configuration
 st.set_page_config(
@@ -28,13 +18,30 @@ st.set_page_config(
 )
 
 # 2. Secure API Integration (Streamlit Secrets)
+MODEL_NAME = 'gemini-1.5-flash'
 try:
     # Authenticate using the key stored in .streamlit/secrets.toml
-    genai.configure(api_key=st.secrets["GOOGLE_API_KEY"])
-    model = genai.GenerativeModel('gemini-1.5-flash')
+    API_KEY = st.secrets["GOOGLE_API_KEY"]
 except Exception as e:
     st.error("⚠️ API Key not detected. Check .streamlit/secrets.toml")
-    model = None
+    API_KEY = None
+
+# Every Gemini call is timed and token-counted in the shared metrics log
+set_context(module="Cognita")
+
+
+def ask_gemini(prompt):
+    """The answer text, or None (with a warning shown) when rate limited.
+
+    Goes through omni.llm like the other apps: shared limiter, 429 cooldown,
+    response cache and metrics.
+    """
+    try:
+        return generate(API_KEY, prompt, model=MODEL_NAME)
+    except ResourceExhausted as e:
+        st.warning(rate_limit_message(e))
+        return None
+
 
 # 3. Dynamic UI Styling (Light/Dark Switchable)
 if 'dark_mode' not in st.session_state:
@@ -231,21 +238,23 @@ with t2:
 
         # Action 1: Academic Support Plan
         if st.button("Draft Support Plan", type="primary", icon=":material/description:", use_container_width=True):
-            if model:
+            if API_KEY:
                 with st.spinner("AI Architecting Strategy..."):
                     prompt = f"Act as an expert MTSS coordinator. Create a 3-step math intervention plan for {selected}. Math Score: {s_data['Math Score (%)']}%."
-                    res = model.generate_content(prompt)
-                    st.session_state.plan, st.session_state.p_name, st.session_state.doc_type = res.text, selected, "Academic Plan"
+                    plan = ask_gemini(prompt)
+                    if plan:
+                        st.session_state.plan, st.session_state.p_name, st.session_state.doc_type = plan, selected, "Academic Plan"
             else:
                 st.error("Gemini API not connected.")
 
         # Action 2: Multi-Lingual Parent Communication
         if st.button("Draft Parent Outreach", icon=":material/mail:", use_container_width=True):
-            if model:
+            if API_KEY:
                 with st.spinner(f"Translating to {language}..."):
                     prompt = f"Draft an empathetic message to the parents of {selected} in {language} regarding extra math support."
-                    res = model.generate_content(prompt)
-                    st.session_state.plan, st.session_state.p_name, st.session_state.doc_type = res.text, selected, f"Parent Outreach ({language})"
+                    plan = ask_gemini(prompt)
+                    if plan:
+                        st.session_state.plan, st.session_state.p_name, st.session_state.doc_type = plan, selected, f"Parent Outreach ({language})"
             else:
                 st.error("Gemini API not connected.")
 
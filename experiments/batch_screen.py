@@ -0,0 +1,69 @@
+import argparse
+import os
+import sys
+from dotenv import load_dotenv
+
+# Make the shared omni/ package (repo root) importable from experiments/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from omni.ingest import load_pdfs_parallel
+from omni.screening import save_table, screen
+
+# --- BATCH GAP ANALYSIS ---
+# Batch version of analyze_resume.py: every resume in a folder against every
+# JD in another, pre-scored locally, with full Gemini audits for the top few.
+
+
+def read_folder(folder):
+    """name -> text for every .pdf / .txt in a folder (PDFs parsed in parallel)."""
+    texts = {}
+    names = sorted(os.listdir(folder))
+    pdfs = [os.path.join(folder, n) for n in names if n.lower().endswith(".pdf")]
+    for page in load_pdfs_parallel(pdfs):
+        name = os.path.basename(page.metadata["source"])
+        texts[name] = texts.get(name, "") + page.page_content + "\n"
+    for name in names:
+        if name.lower().endswith(".txt"):
+            with open(os.path.join(folder, name), encoding="utf-8", errors="ignore") as f:
+                texts[name] = f.read()
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank resumes against job descriptions.")
+    parser.add_argument("--resumes", default="resumes", help="folder of resume PDFs/TXTs")
+    parser.add_argument("--jds", default="jds", help="folder of job description PDFs/TXTs")
+    parser.add_argument("--top", type=int, default=3,
+                        help="full LLM audits per JD (0 = local screening only, no LLM)")
+    parser.add_argument("--out", default="screening.csv", help=".csv or .parquet")
+    args = parser.parse_args()
+
+    # 1. SETUP
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY")
+
+    # 2. LOAD DATA
+    print("--- 📂 Reading resumes and job descriptions... ---")
+    resumes, jds = read_folder(args.resumes), read_folder(args.jds)
+    if not resumes or not jds:
+        print(f"❌ Error: need files in both '{args.resumes}/' and '{args.jds}/'")
+        exit()
+    print(f"   ✅ {len(resumes)} resumes x {len(jds)} job descriptions")
+
+    # 3. SCREEN (local pre-score, then concurrent audits of the shortlist)
+    table = screen(api_key, resumes, jds, top_n=args.top,
+                   on_progress=lambda message: print(f"   {message}"))
+
+    # 4. RESULTS
+    save_table(table, args.out)
+    for jd, group in table.groupby("jd", sort=False):
+        print(f"\n--- 🎯 {jd} ---")
+        for row in group.head(max(args.top, 5)).itertuples():
+            print(f"   {row.rank}. {row.resume}  match={row.match_score}  "
+                  f"human={row.human_score} (local {row.local_human_score})  "
+                  f"prescore={row.prescore:.3f}")
+    print(f"\n--- ✅ Ranked table written to {args.out} ---")
+
+
+# Worker processes re-import this file, so only run when executed directly
+if __name__ == "__main__":
+    main()
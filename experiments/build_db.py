@@ -1,71 +1,140 @@
+import hashlib
+import json
 import os
-import time
+import sys
 from dotenv import load_dotenv
 
 # --- IMPORTS ---
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import Chroma
+
+# Make the shared omni/ package (repo root) importable from experiments/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from omni.embed_pipeline import embed_and_store
+from omni.ingest import load_pdfs_parallel
+from omni.llm import get_embeddings
+from omni.sop_index import (chunk_ids, existing_ids, load_keyword_index, open_for_build,
+                             save_keyword_index, save_manifest, store_vectors,
+                             update_metadata)
+from omni.tracing import report as report_trace, span
 # -----------------------
 
-# 1. SETUP
-load_dotenv()
-if "GOOGLE_API_KEY" not in os.environ:
-    os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY")
-
-# 2. LOAD PDFS
-documents = []
-print("--- 📂 Scanning for PDFs... ---")
-for filename in os.listdir('.'):
-    if filename.endswith('.pdf'):
-        try:
-            loader = PyPDFLoader(filename)
-            docs = loader.load()
-            documents.extend(docs)
-            print(f"   ✅ Loaded: {filename} ({len(docs)} pages)")
-        except Exception as e:
-            print(f"   ❌ Failed to load {filename}: {e}")
-
-if not documents:
-    print("❌ No PDFs found.")
-    exit()
-
-# 3. CHUNK THE DATA
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000, chunk_overlap=100)
-chunks = text_splitter.split_documents(documents)
-print(f"--- 🔪 Split into {len(chunks)} text chunks ---")
-
-# 4. INITIALIZE DATABASE & EMBEDDINGS
-print("--- 💾 Initializing Vector Database... ---")
-# WE USE THE NEWER MODEL HERE: text-embedding-004
-embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
-
-# Initialize an empty DB first
-vector_db = Chroma(
-    embedding_function=embeddings,
-    persist_directory="./chroma_db"
-)
-
-# 5. SAFE BATCH INSERTION (The Fix)
-batch_size = 5  # Process 5 chunks at a time
-total_batches = len(chunks) // batch_size + 1
-
-print(f"--- 🐢 Starting Safe Batch Processing ({total_batches} batches) ---")
-
-for i in range(0, len(chunks), batch_size):
-    batch = chunks[i: i + batch_size]
-
-    if not batch:
-        continue
-
-    try:
-        vector_db.add_documents(batch)
-        print(f"   ✅ Processed batch {i//batch_size + 1}/{total_batches}")
-        time.sleep(2)  # 2-second pause to be kind to the API
-    except Exception as e:
-        print(f"   ⚠️ Error on batch {i}: {e}")
-        time.sleep(10)  # Longer pause if we hit an error
-
-print("--- ✅ Database Built Successfully! ---")
+PERSIST_DIR = "./chroma_db"
+COLLECTION = "langchain"  # LangChain's default collection name
+CHECKPOINT = os.path.join(PERSIST_DIR, "build_db.checkpoint")
+
+
+def main():
+    # 1. SETUP
+    load_dotenv()
+    if "GOOGLE_API_KEY" not in os.environ:
+        os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY")
+
+    # 2. LOAD PDFS (in parallel, one process per CPU core)
+    print("--- 📂 Scanning for PDFs... ---")
+    pdf_files = sorted(f for f in os.listdir('.') if f.endswith('.pdf'))
+
+    def loaded(filename, pages, error):
+        if error:
+            print(f"   ❌ Failed to load {filename}: {error}")
+        else:
+            print(f"   ✅ Loaded: {filename} ({pages} pages)")
+
+    with span("ingest.parse", files=len(pdf_files)):
+        documents = load_pdfs_parallel(pdf_files, on_progress=loaded)
+
+    if not documents:
+        print("❌ No PDFs found.")
+        exit()
+
+    # 3. CHUNK THE DATA
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000, chunk_overlap=100)
+    with span("ingest.split", pages=len(documents)):
+        chunks = text_splitter.split_documents(documents)
+    print(f"--- 🔪 Split into {len(chunks)} text chunks ---")
+
+    # Stable ids from chunk content: reruns overwrite instead of duplicating
+    by_source = {}
+    for chunk in chunks:
+        by_source.setdefault(chunk.metadata["source"], []).append(chunk)
+    chunks, ids = [], []
+    for source, source_chunks in by_source.items():
+        chunks.extend(source_chunks)
+        ids.extend(chunk_ids(source, source_chunks))
+
+    # 4. INITIALIZE DATABASE & EMBEDDINGS
+    print("--- 💾 Initializing Vector Database... ---")
+    # WE USE THE NEWER MODEL HERE: text-embedding-004 (pooled + rate limited)
+    embeddings = get_embeddings(os.environ["GOOGLE_API_KEY"], max_wait=None)
+
+    # Open (or create) the collection through the shared backend switch. A
+    # build without a manifest (e.g. the original Chroma one) starts clean,
+    # unless a checkpoint says these rows are our own interrupted run.
+    vector_db, manifest = open_for_build(COLLECTION, os.environ["GOOGLE_API_KEY"], PERSIST_DIR,
+                                         resume=os.path.exists(CHECKPOINT))
+
+    # Resume: chunks already in the DB (an earlier build, or the batches an
+    # interrupted run stored) are seeded into the checkpoint and not embedded again
+    done = set(existing_ids(vector_db, ids))
+    if done:
+        print(f"--- ♻️ {len(done)} chunks already embedded ---")
+    os.makedirs(PERSIST_DIR, exist_ok=True)  # opening the store no longer creates it
+    with open(CHECKPOINT, "w") as f:
+        f.writelines(json.dumps(chunk_id) + "\n" for chunk_id in done)
+
+    # 5. ADAPTIVE BATCH INSERTION (big batches, backs off on 429, retries failures)
+    print(f"--- 🚀 Embedding {len(set(ids) - done)} new chunks ---")
+
+    def store(batch_ids, vectors, texts, metadatas):
+        store_vectors(vector_db, batch_ids, vectors, texts, metadatas)
+
+    def embedded(completed, total, controller):
+        print(f"   ✅ {completed}/{total} chunks "
+              f"(batch {controller.batch_size}, {controller.concurrency} in flight)")
+
+    # Embedding runs in worker threads: their "embed" spans show up on their own tracks
+    with span("index.write", chunks=len(chunks)):
+        embed_and_store(ids, [c.page_content for c in chunks], [c.metadata for c in chunks],
+                        embeddings, store, checkpoint_path=CHECKPOINT, on_progress=embedded)
+
+    # Chunks that were already stored keep their vectors, but may have moved pages
+    if done:
+        kept = [i for i, chunk_id in enumerate(ids) if chunk_id in done]
+        with span("index.metadata", chunks=len(kept)):
+            update_metadata(vector_db, [ids[i] for i in kept], [chunks[i].metadata for i in kept])
+
+    # 6. DROP CHUNKS FROM THE PREVIOUS BUILD THAT NO LONGER EXIST
+    stale = {i for f in manifest["files"].values() for i in f["chunks"]} - set(ids)
+    if stale:
+        with span("index.delete", chunks=len(stale)):
+            vector_db.delete(ids=list(stale))
+        print(f"--- 🧹 Removed {len(stale)} stale chunks ---")
+
+    # 7. KEYWORD INDEX (BM25 half of hybrid search, updated incrementally)
+    with span("index.keywords"):
+        keywords = load_keyword_index(COLLECTION, PERSIST_DIR, vector_db)
+        keywords.remove(stale)
+        new = [(chunk_id, c.page_content) for chunk_id, c in zip(ids, chunks) if chunk_id not in keywords]
+        keywords.add([chunk_id for chunk_id, _ in new], [text for _, text in new])
+        save_keyword_index(COLLECTION, keywords, PERSIST_DIR)
+    print(f"--- 🔤 Keyword index: {len(keywords)} chunks ({len(new)} new) ---")
+
+    # 8. MANIFEST (lets capstone_app re-index this collection incrementally)
+    files = {}
+    for source, source_chunks in by_source.items():
+        with open(source, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        files[source] = {"sha256": digest, "chunks": chunk_ids(source, source_chunks)}
+    save_manifest(COLLECTION, {"version": manifest["version"] + 1, "files": files}, PERSIST_DIR)
+
+    # The build is complete: the next run starts from the DB, not a stale checkpoint
+    os.remove(CHECKPOINT)
+    print("--- ✅ Database Built Successfully! ---")
+
+    # 9. STAGE BREAKDOWN (only with OMNI_TRACE=1; also writes trace.json for Perfetto)
+    report_trace()
+
+
+# Worker processes re-import this file, so only run when executed directly
+if __name__ == "__main__":
+    main()
@@ -1,81 +1,173 @@
+import argparse
 import os
 import sys
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
-from pypdf import PdfReader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-# 1. SETUP
-load_dotenv()
-API_KEY = os.getenv("GOOGLE_API_KEY")
-client = genai.Client(api_key=API_KEY)
+# Make the shared omni/ package (repo root) importable from experiments/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from omni.context import RETRIEVE_K, pack_context
+from omni.context_cache import LocalCaches, get_or_create
+from omni.ingest import count_pages, load_pdfs_parallel
+from omni.llm import DEFAULT_MODEL
+from omni.ratelimit import estimate_tokens
+from omni.sop_index import search, upsert_sources
 
-# 2. THE INGESTION ENGINE (Multi-File Support)
-print("--- 📂 Reading ALL PDFs in folder... ---")
+MODEL = DEFAULT_MODEL  # context caching needs a pinned model version, not "-latest"
+COLLECTION = "chat-pdf"
 
-pdf_text = ""
-pdf_count = 0
+# How the corpus reaches the model, by size (~tokens):
+#   inline     small corpus, below the context-cache minimum: resend it, it's cheap
+#   cache      upload once as Gemini cached content, questions only reference it
+#   retrieval  too big to cache or to fit: index it, send the relevant chunks only
+INLINE_MAX_TOKENS = int(os.getenv("CHAT_PDF_INLINE_MAX_TOKENS", "4096"))
+RETRIEVAL_MIN_TOKENS = int(os.getenv("CHAT_PDF_RETRIEVAL_MIN_TOKENS", "200000"))
+# The mode is picked from page counts, before anything is parsed
+TOKENS_PER_PAGE = int(os.getenv("CHAT_PDF_TOKENS_PER_PAGE", "500"))
 
-# Loop through files in the current directory
-for filename in os.listdir('.'):
-    if filename.endswith('.pdf'):
-        try:
-            reader = PdfReader(filename)
-            # Add a header so the AI knows which file the text comes from
-            pdf_text += f"\n--- START OF FILE: {filename} ---\n"
-            for page in reader.pages:
-                pdf_text += page.extract_text() + "\n"
+RULES = """
+    You are an expert analyst.
+    Answer the user's questions based strictly on the documents provided.
+    If the answer is not in the text, say "I don't find that in the documents."
+    """
+
+
+def choose_mode(tokens):
+    if tokens <= INLINE_MAX_TOKENS:
+        return "inline"
+    if tokens >= RETRIEVAL_MIN_TOKENS:
+        return "retrieval"
+    return "cache"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat with every PDF in this folder.")
+    parser.add_argument("--mode", choices=["auto", "inline", "cache", "retrieval"],
+                        default="auto", help="how the corpus is sent (default: by size)")
+    args = parser.parse_args()
+
+    # 1. SETUP
+    load_dotenv()
+    API_KEY = os.getenv("GOOGLE_API_KEY")
+    client = genai.Client(api_key=API_KEY)
+
+    # 2. THE INGESTION ENGINE (Multi-File Support, parsed in parallel)
+    print("--- 📂 Reading ALL PDFs in folder... ---")
+
+    pdf_files = sorted(f for f in os.listdir('.') if f.endswith('.pdf'))
+
+    def skipped(filename, error):
+        print(f"   ⚠️ Skipped {filename}: {error}")
+
+    def report(filename, pages, error):
+        if error:
+            skipped(filename, error)
+        else:
             print(f"   ✅ Ingested: {filename}")
-            pdf_count += 1
-        except Exception as e:
-            print(f"   ⚠️ Skipped {filename}: {e}")
 
-if pdf_count == 0:
-    print("❌ Error: No PDFs found. Drag a .pdf file into this folder first.")
-    exit()
+    # Sizing only needs page counts; the text is parsed once, by whichever mode needs it
+    page_counts = count_pages(pdf_files, on_error=skipped)
+    pdf_count = len(page_counts)
+
+    if pdf_count == 0:
+        print("❌ Error: No PDFs found. Drag a .pdf file into this folder first.")
+        exit()
 
-print(f"--- 🧠 Loaded {pdf_count} documents into memory ---")
+    tokens = TOKENS_PER_PAGE * sum(page_counts.values())
+    mode = choose_mode(tokens) if args.mode == "auto" else args.mode
+    print(f"--- 🧠 Found {pdf_count} documents ({sum(page_counts.values())} pages, "
+          f"~{tokens} tokens), mode: {mode} ---")
 
-# 3. THE CHAT LOOP (Now with Better Exit Logic)
-system_instruction = f"""
-You are an expert analyst. 
-Your brain contains ONLY the following documents. 
-Answer the user's questions based strictly on this text.
-If the answer is not in the text, say "I don't find that in the documents."
+    if mode == "retrieval":
+        # Incremental index under ./chroma_db: only new or changed PDFs are parsed and embedded
+        files = []
+        for filename in page_counts:
+            with open(filename, "rb") as f:
+                files.append((filename, f.read()))
+        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+        stats = upsert_sources(COLLECTION, files, splitter, API_KEY, on_progress=report)
+        print(f"--- 🔎 Retrieval index: {stats['chunks_total']} chunks "
+              f"({stats['chunks_added']} newly embedded) ---")
+        config = types.GenerateContentConfig(system_instruction=RULES)
+    else:
+        pages = load_pdfs_parallel(list(page_counts), on_progress=report)
 
-DOCUMENTS CONTENT:
-{pdf_text}
-"""
+        # Add a header so the AI knows which file the text comes from
+        parts = []
+        current_file = None
+        for page in pages:
+            if page.metadata["source"] != current_file:
+                current_file = page.metadata["source"]
+                parts.append(f"\n--- START OF FILE: {current_file} ---\n")
+            parts.append(page.page_content + "\n")
+        pdf_text = "".join(parts)
+        print(f"--- 📄 Parsed ~{estimate_tokens(pdf_text)} tokens of text ---")
 
-print("\n--- 🤖 Knowledge Base Ready ---")
-print("Type 'quit', 'exit', or 'done' to end the session.\n")
+        system_instruction = f"""
+    You are an expert analyst.
+    Your brain contains ONLY the following documents.
+    Answer the user's questions based strictly on this text.
+    If the answer is not in the text, say "I don't find that in the documents."
 
-while True:
-    try:
-        user_question = input("Ask the Documents: ").strip()
+    DOCUMENTS CONTENT:
+    {pdf_text}
+    """
+        config = types.GenerateContentConfig(system_instruction=system_instruction)
 
-        # Check for multiple exit keywords
-        if user_question.lower() in ["quit", "exit", "done", "bye"]:
-            print("👋 Exiting. Good luck!")
+        if mode == "cache":
+            # Upload once; each question then only sends its own tokens
+            try:
+                cache, reused = get_or_create(client.caches, MODEL, system_instruction)
+                config = types.GenerateContentConfig(cached_content=cache.name)
+                print(f"--- 📌 {'Reusing' if reused else 'Created'} context cache {cache.name} ---")
+            except Exception as e:
+                # Stand-in keeps the corpus locally; it is inlined like before
+                cache, _ = get_or_create(LocalCaches(), MODEL, system_instruction)
+                config = types.GenerateContentConfig(system_instruction=cache.system_instruction)
+                print(f"   ⚠️ Context caching unavailable ({e}); using the local stand-in")
+
+    # 3. THE CHAT LOOP (Now with Better Exit Logic)
+    print("\n--- 🤖 Knowledge Base Ready ---")
+    print("Type 'quit', 'exit', or 'done' to end the session.\n")
+
+    while True:
+        try:
+            user_question = input("Ask the Documents: ").strip()
+
+            # Check for multiple exit keywords
+            if user_question.lower() in ["quit", "exit", "done", "bye"]:
+                print("👋 Exiting. Good luck!")
+                break
+
+            # Skip empty inputs (hitting enter accidentally)
+            if not user_question:
+                continue
+
+            contents = user_question
+            if mode == "retrieval":
+                results = search(COLLECTION, API_KEY, user_question, k=RETRIEVE_K)
+                context, used = pack_context(results)
+                print(f"   📦 Context: {used['tokens']} tokens from {used['used']} chunks")
+                contents = f"DOCUMENTS CONTENT:\n{context}\n\nQUESTION:\n{user_question}"
+
+            response = client.models.generate_content(
+                model=MODEL,
+                config=config,
+                contents=contents
+            )
+
+            print(f"\nAnswer: {response.text}\n")
+
+        except KeyboardInterrupt:
+            # Handles Ctrl+C gracefully
+            print("\n\n👋 Forced Exit. See you later!")
             break
+        except Exception as e:
+            print(f"❌ Error: {e}")
+
 
-        # Skip empty inputs (hitting enter accidentally)
-        if not user_question:
-            continue
-
-        response = client.models.generate_content(
-            model="gemini-flash-latest",
-            config=types.GenerateContentConfig(
-                system_instruction=system_instruction
-            ),
-            contents=user_question
-        )
-
-        print(f"\nAnswer: {response.text}\n")
-
-    except KeyboardInterrupt:
-        # Handles Ctrl+C gracefully
-        print("\n\n👋 Forced Exit. See you later!")
-        break
-    except Exception as e:
-        print(f"❌ Error: {e}")
+# Worker processes re-import this file, so only run when executed directly
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,20 @@ import sys
 from dotenv import load_dotenv
 
 # --- IMPORTS ---
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-from langchain_community.vectorstores import Chroma
+from google.api_core.exceptions import ResourceExhausted
+
+# Make the shared omni/ package (repo root) importable from experiments/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from omni.context import RETRIEVE_K, pack_context
+from omni.llm import generate
+from omni.retry import rate_limit_message
+from omni.sop_index import list_collections, search
+from omni.tracing import collect, is_enabled, report, span
 # ----------------
 
+PERSIST_DIR = "./chroma_db"
+COLLECTION = "langchain"  # LangChain's default collection name (see build_db.py)
+
 # 1. SETUP
 load_dotenv()
 if "GOOGLE_API_KEY" not in os.environ:
@@ -15,23 +25,17 @@ if "GOOGLE_API_KEY" not in os.environ:
 # 2. LOAD THE BRAIN
 print("--- 🧠 Waking up the Vector Database... ---")
 try:
-    # We keep the embedding model the same because that's what your DB was built with.
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model="models/text-embedding-004")
-    vector_db = Chroma(
-        persist_directory="./chroma_db",
-        embedding_function=embeddings
-    )
+    # Only check the build is there: search() opens (and caches) the collection itself
+    if COLLECTION not in list_collections(PERSIST_DIR):
+        raise FileNotFoundError(f"no '{COLLECTION}' collection in {PERSIST_DIR}")
 except Exception as e:
     print(f"❌ Critical Error loading database: {e}")
     print("Did you run build_db.py first?")
     sys.exit()
 
 # 3. SETUP THE AI (UPDATED MODEL)
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",  # <--- UPDATED to 2.5 (1.5 is retired)
-    temperature=0
-)
+# Answers go through omni.llm, so they share the apps' rate limiter and 429 cooldown
+MODEL_NAME = "gemini-2.5-flash"  # <--- UPDATED to 2.5 (1.5 is retired)
 
 print("--- ✅ Manual RAG System Online (Type 'quit' to exit) ---")
 
@@ -47,38 +51,58 @@ while True:
     print("   🔍 Searching database...")
 
     try:
-        # STEP A: Search
-        results = vector_db.similarity_search(query, k=3)
-
-        if not results:
-            print("   ⚠️ No relevant info found in documents.")
-            continue
-
-        # STEP B: Context
-        context_text = "\n\n".join([doc.page_content for doc in results])
-
-        # STEP C: Prompt
-        prompt = f"""
-        You are a helpful assistant. Answer the user's question based ONLY on the context below.
-        If the answer is not in the context, say "I don't know."
-
-        CONTEXT:
-        {context_text}
-
-        QUESTION:
-        {query}
-        """
-
-        # STEP D: Answer
-        response = llm.invoke(prompt)
-
-        print(f"\n🤖 ANSWER:\n{response.content}")
-
-        # Sources
-        print("\n📄 SOURCES:")
-        for doc in results:
-            source = doc.metadata.get('source', 'Unknown').split('/')[-1]
-            print(f" - {source}")
+        with collect() as trace, span("query"):
+            # STEP A: Search (hybrid BM25 + vector; repeat questions come from the
+            # query cache until build_db.py changes the index)
+            results = search(COLLECTION, os.environ["GOOGLE_API_KEY"], query, k=RETRIEVE_K,
+                             persist_dir=PERSIST_DIR)
+
+            if not results:
+                print("   ⚠️ No relevant info found in documents.")
+                continue
+
+            # STEP B: Context (deduplicated, stitched and capped at the token budget)
+            context_text, used = pack_context(results)
+            print(f"   📦 Context: {used['tokens']}/{used['budget']} tokens from "
+                  f"{used['used']} of {used['chunks']} chunks "
+                  f"({used['merged']} merged, {used['duplicates']} duplicates dropped)")
+
+            # STEP C: Prompt
+            prompt = f"""
+            You are a helpful assistant. Answer the user's question based ONLY on the context below.
+            If the answer is not in the context, say "I don't know."
+
+            CONTEXT:
+            {context_text}
+
+            QUESTION:
+            {query}
+            """
+
+            # STEP D: Answer
+            with span("generate"):
+                try:
+                    answer = generate(os.environ["GOOGLE_API_KEY"], prompt, model=MODEL_NAME,
+                                      temperature=0)
+                except ResourceExhausted as e:
+                    print(f"   ⏳ {rate_limit_message(e)}")
+                    continue
+
+            print(f"\n🤖 ANSWER:\n{answer}")
+
+            # Sources
+            print("\n📄 SOURCES:")
+            sources = [doc.metadata.get('source', 'Unknown').split('/')[-1] for doc in results]
+            for source in dict.fromkeys(sources):
+                print(f" - {source}")
+
+        # Per-question stage timings (only with OMNI_TRACE=1)
+        if is_enabled():
+            print()
+            trace.print_breakdown()
 
     except Exception as e:
         print(f"❌ Error: {e}")
+
+# 5. TRACE (whole session, for Perfetto; only with OMNI_TRACE=1)
+report()
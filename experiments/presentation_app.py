@@ -1,5 +1,6 @@
 import streamlit as st
 import os
+import sys
 import json
 import io
 import re
@@ -9,27 +10,32 @@ import base64
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.document_loaders import PyPDFLoader
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.dml.color import RGBColor
 from pptx.enum.text import PP_ALIGN
 from pptx.enum.shapes import MSO_SHAPE
 from docx import Document
+from google.api_core.exceptions import ResourceExhausted
+
+# Make the shared omni/ package (repo root) importable from experiments/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from omni.llm import generate
+from omni.metrics import set_context
+from omni.pdf import extract_text
+from omni.retry import rate_limit_message
 
 # --- 1. CONFIGURATION ---
 st.set_page_config(page_title="AI Presentation Architect", layout="wide")
+set_context(module="Presentation")  # tags this app's calls in the metrics log
 
 # --- 2. AI AGENTS ---
 
 
 def get_gemini_response(api_key, prompt, temp=0.3):
-    os.environ["GOOGLE_API_KEY"] = api_key
     # FIX: Use the specific version ID to avoid "404 Not Found"
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-1.5-flash-001", temperature=temp)
-    return llm.invoke(prompt).content
+    return generate(api_key, prompt,
+                    model="gemini-1.5-flash-001", temperature=temp)
 
 
 def generate_design_theme(api_key, topic, audience):
@@ -46,7 +52,7 @@ def generate_design_theme(api_key, topic, audience):
     response = get_gemini_response(api_key, prompt, temp=0.7)
     try:
         return json.loads(response.replace("```json", "").replace("```", "").strip())
-    except:
+    except ValueError:
         return {"theme_name": "Default", "bg_hex": "#FFFFFF", "text_hex": "#000000", "accent_hex": "#0000FF", "chart_palette": ["#0000FF", "#FF0000"]}
 
 # --- 3. VISUAL ENGINE (DIRECT API) ---
@@ -117,10 +123,7 @@ def extract_text_from_file(uploaded_file):
     text = ""
     try:
         if file_type == 'pdf':
-            with open("temp.pdf", "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            loader = PyPDFLoader("temp.pdf")
-            text = "\n".join([p.page_content for p in loader.load()])
+            text = extract_text(uploaded_file)
         elif file_type == 'docx':
             doc = Document(uploaded_file)
             text = "\n".join([p.text for p in doc.paragraphs])
@@ -185,7 +188,7 @@ def create_chart_image(chart_info, theme_data):
         img_buffer.seek(0)
         plt.close(fig)
         return img_buffer
-    except:
+    except Exception:
         return None
 
 
@@ -223,7 +226,7 @@ def create_ppt_from_json(json_str, theme_data, google_key):
     clean_json = json_str.replace("```json", "").replace("```", "").strip()
     try:
         slides_data = json.loads(clean_json)
-    except:
+    except ValueError:
         return None
 
     if 'image_prompt' in str(clean_json):
@@ -376,58 +379,65 @@ with st.container(border=True):
 if st.button("Generate Deck", type="primary"):
     if (files or notes) and topic:
         with st.status("Architecting Presentation...", expanded=True) as status:
-            st.write("🎨 Designing theme...")
-            theme_data = generate_design_theme(google_key, topic, audience)
-            st.session_state.theme_data = theme_data
-
-            text = ""
-            if files:
-                for f in files:
-                    text += extract_text_from_file(f)
-            if notes:
-                text += f"\n\nNOTES: {notes}"
-
-            st.write("✍️ Writing content...")
-            chart_rule = "GENERATE A CHART with estimated values if numbers are missing." if simulate_data else "No charts unless numbers exist."
-
-            prompt = f"""
-            Role: Expert Presentation Designer. Topic: {topic} | Audience: {audience}
-            USER INSTRUCTIONS: "{style_guide}"
-            TARGET LENGTH: EXACTLY {slide_count} SLIDES.
-            SOURCE: {text[:30000]}
+            try:
+                st.write("🎨 Designing theme...")
+                theme_data = generate_design_theme(google_key, topic, audience)
+                st.session_state.theme_data = theme_data
+
+                text = ""
+                if files:
+                    for f in files:
+                        text += extract_text_from_file(f)
+                if notes:
+                    text += f"\n\nNOTES: {notes}"
+
+                st.write("✍️ Writing content...")
+                chart_rule = "GENERATE A CHART with estimated values if numbers are missing." if simulate_data else "No charts unless numbers exist."
+
+                prompt = f"""
+                Role: Expert Presentation Designer. Topic: {topic} | Audience: {audience}
+                USER INSTRUCTIONS: "{style_guide}"
+                TARGET LENGTH: EXACTLY {slide_count} SLIDES.
+                SOURCE: {text[:30000]}
             
-            RULES:
-            1. Generate exactly {slide_count} slides.
-            2. Use Markdown bold (**text**) for emphasis.
-            3. {chart_rule}
-            4. If no chart, add "image_prompt": "Description of visual..."
-            5. **EMOJI RULE**: SPARINGLY. Only 1 per slide title if relevant.
+                RULES:
+                1. Generate exactly {slide_count} slides.
+                2. Use Markdown bold (**text**) for emphasis.
+                3. {chart_rule}
+                4. If no chart, add "image_prompt": "Description of visual..."
+                5. **EMOJI RULE**: SPARINGLY. Only 1 per slide title if relevant.
             
-            FORMAT (JSON ONLY):
-            [ {{ 
-                "type": "content", 
-                "title": "Slide **Title**", 
-                "points": ["Point 1", "Point 2"], 
-                "chart": {{ "type": "BAR", "categories": ["A", "B"], "values": [10, 20], "title": "Sales" }},
-                "image_prompt": "Visual description..."
-            }} ]
-            """
-            response = get_gemini_response(google_key, prompt, temp=0.5)
-            try:
-                st.session_state.deck_json = json.loads(
-                    response.replace("```json", "").replace("```", "").strip())
-                st.session_state.deck_topic = topic
-
-                st.write("🎨 Synthesizing Visuals...")
-                st.session_state.ppt_binary = create_ppt_from_json(
-                    response, theme_data, google_key)
-
-                status.update(label="Complete",
-                              state="complete", expanded=False)
-            except Exception as e:
-                st.error("AI Error")
-                st.write(f"Error: {e}")
-                st.expander("Raw Output").write(response)
+                FORMAT (JSON ONLY):
+                [ {{ 
+                    "type": "content", 
+                    "title": "Slide **Title**", 
+                    "points": ["Point 1", "Point 2"], 
+                    "chart": {{ "type": "BAR", "categories": ["A", "B"], "values": [10, 20], "title": "Sales" }},
+                    "image_prompt": "Visual description..."
+                }} ]
+                """
+                response = get_gemini_response(google_key, prompt, temp=0.5)
+            except ResourceExhausted as e:
+                # Includes CoolingDown / Throttled: nothing was generated
+                response = None
+                status.update(label="Rate Limited", state="error", expanded=False)
+                st.warning(rate_limit_message(e))
+            if response is not None:
+                try:
+                    st.session_state.deck_json = json.loads(
+                        response.replace("```json", "").replace("```", "").strip())
+                    st.session_state.deck_topic = topic
+
+                    st.write("🎨 Synthesizing Visuals...")
+                    st.session_state.ppt_binary = create_ppt_from_json(
+                        response, theme_data, google_key)
+
+                    status.update(label="Complete",
+                                  state="complete", expanded=False)
+                except Exception as e:
+                    st.error("AI Error")
+                    st.write(f"Error: {e}")
+                    st.expander("Raw Output").write(response)
 
 if st.session_state.deck_json and st.session_state.theme_data:
     st.divider()
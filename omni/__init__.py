@@ -0,0 +1 @@
+"""Shared building blocks for the Omni-Agent apps and the experiments scripts."""
@@ -0,0 +1,162 @@
+"""
+Approximate nearest-neighbour search: IVF + product quantization, in NumPy.
+
+Exact search scans every vector. Past a few hundred thousand chunks that
+scan dominates a query, so the ANN mode narrows it down:
+
+1. IVF: k-means splits the corpus into `nlist` cells. A query only scans
+   the `nprobe` cells whose centroids are closest to it.
+2. PQ: inside those cells each vector is stored as `m` one-byte codes (its
+   residual from the centroid, quantized per subspace), so scoring a
+   candidate is m table lookups instead of a D-dimensional dot product.
+3. Rerank: the best `k * rerank` candidates are rescored exactly against
+   the full vectors, which recovers most of the recall PQ gives up.
+
+Higher nprobe / rerank means better recall and slower queries; see
+experiments/bench_ann.py for the trade-off on a synthetic corpus. New
+vectors are encoded with the existing centroids and codebooks (incremental
+insertion, no retraining) until the corpus has grown RETRAIN_GROWTH times
+past the size it was trained on.
+
+Vectors are expected L2-normalized, so inner product == cosine similarity.
+"""
+import numpy as np
+
+NPROBE = 8
+RERANK = 16
+PQ_SUBSPACES = 16
+KSUB = 256  # centroids per subspace: one uint8 code each
+MIN_ROWS = 10_000  # below this, exact search is both faster and exact
+RETRAIN_GROWTH = 4
+TRAIN_SAMPLE = 50_000
+SAMPLE_PER_CELL = 32  # k-means needs a few dozen points per centroid, not all of them
+KMEANS_ITERATIONS = 10
+ASSIGN_BLOCK = 16384
+
+
+def _nearest(x, centroids):
+    """Index of the closest centroid (L2) for every row of x."""
+    norms = (centroids ** 2).sum(axis=1)
+    out = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), ASSIGN_BLOCK):
+        block = x[start:start + ASSIGN_BLOCK]
+        out[start:start + ASSIGN_BLOCK] = (norms - 2 * block @ centroids.T).argmin(axis=1)
+    return out
+
+
+def kmeans(x, k, iterations=KMEANS_ITERATIONS, seed=0):
+    """Plain Lloyd's k-means; empty clusters are re-seeded from random points."""
+    rng = np.random.default_rng(seed)
+    x = np.asarray(x, dtype=np.float32)
+    k = min(k, len(x))
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest(x, centroids)
+        counts = np.bincount(assign, minlength=k)
+        filled = counts > 0
+        # Sum each cluster in one pass over rows sorted by cluster
+        order = np.argsort(assign, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.add.reduceat(x[order], starts[filled], axis=0)
+        centroids[filled] = sums / counts[filled, None]
+        if not filled.all():
+            centroids[~filled] = x[rng.choice(len(x), (~filled).sum(), replace=False)]
+    return centroids
+
+
+def _subspaces(dims, wanted):
+    # PQ needs equal-width subspaces: largest divisor of dims not above `wanted`
+    return max(m for m in range(1, min(wanted, dims) + 1) if dims % m == 0)
+
+
+class IVFPQIndex:
+    def __init__(self, centroids, codebooks, assign, codes, trained_rows):
+        self.centroids = centroids      # (nlist, D)
+        self.codebooks = codebooks      # (m, KSUB, D / m)
+        self.assign = assign            # (N,) cell per row
+        self.codes = codes              # (N, m) uint8
+        self.trained_rows = trained_rows
+        # Inverted lists: rows of cell c are order[offsets[c]:offsets[c + 1]]
+        self.order = np.argsort(assign, kind="stable")
+        self.offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(assign, minlength=len(centroids)))])
+
+    @classmethod
+    def train(cls, vectors, nlist=None, m=PQ_SUBSPACES, seed=0):
+        """Learns centroids and codebooks from (a sample of) vectors, then encodes them all."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n, dims = vectors.shape
+        nlist = nlist or max(1, min(n, int(4 * np.sqrt(n))))
+        m = _subspaces(dims, m)
+        rng = np.random.default_rng(seed)
+        size = min(n, TRAIN_SAMPLE, max(SAMPLE_PER_CELL * nlist, SAMPLE_PER_CELL * KSUB))
+        sample = vectors[np.sort(rng.choice(n, size, replace=False))]
+
+        centroids = kmeans(sample, nlist, seed=seed)
+        residuals = sample - centroids[_nearest(sample, centroids)]
+        width = dims // m
+        codebooks = np.zeros((m, KSUB, width), dtype=np.float32)
+        for j in range(m):
+            book = kmeans(residuals[:, j * width:(j + 1) * width], KSUB, seed=seed + j + 1)
+            codebooks[j, :len(book)] = book
+
+        empty = cls(centroids, codebooks, np.zeros(0, dtype=np.int64),
+                    np.zeros((0, m), dtype=np.uint8), n)
+        return empty.extended(vectors)
+
+    def __len__(self):
+        return len(self.assign)
+
+    def _encode(self, vectors):
+        assign = _nearest(vectors, self.centroids)
+        residuals = vectors - self.centroids[assign]
+        m, _, width = self.codebooks.shape
+        codes = np.empty((len(vectors), m), dtype=np.uint8)
+        for j in range(m):
+            codes[:, j] = _nearest(residuals[:, j * width:(j + 1) * width], self.codebooks[j])
+        return assign, codes
+
+    def extended(self, vectors):
+        """A new index with `vectors` appended as rows len(self).. (no retraining)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return self
+        assign, codes = self._encode(vectors)
+        return IVFPQIndex(self.centroids, self.codebooks,
+                          np.concatenate([self.assign, assign]),
+                          np.concatenate([self.codes, codes]), self.trained_rows)
+
+    def subset(self, rows):
+        """A new index keeping only `rows`, renumbered 0..len(rows)."""
+        return IVFPQIndex(self.centroids, self.codebooks, self.assign[rows],
+                          self.codes[rows], self.trained_rows)
+
+    def needs_retrain(self, rows):
+        return rows > RETRAIN_GROWTH * self.trained_rows
+
+    def search(self, query, k, nprobe=NPROBE):
+        """Candidate rows for a normalized query, best approximate score first."""
+        coarse = self.centroids @ query
+        nprobe = min(nprobe, len(coarse))
+        cells = np.argpartition(-coarse, nprobe - 1)[:nprobe]
+        rows = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in cells])
+        if not len(rows):
+            return rows
+
+        # q . x ~= q . centroid + sum_j q_j . codebook_j[code_j]
+        m, _, width = self.codebooks.shape
+        table = np.einsum("jkd,jd->jk", self.codebooks, query.reshape(m, width))
+        scores = coarse[self.assign[rows]] + table[np.arange(m), self.codes[rows]].sum(axis=1)
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return rows[top[np.argsort(-scores[top])]]
+
+    def save(self, path):
+        np.savez(path, centroids=self.centroids, codebooks=self.codebooks,
+                 assign=self.assign, codes=self.codes, trained_rows=self.trained_rows)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["centroids"], data["codebooks"], data["assign"], data["codes"],
+                   int(data["trained_rows"]))
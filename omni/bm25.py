@@ -0,0 +1,173 @@
+"""
+Keyword search for SOP collections: an in-process BM25 inverted index.
+
+Embeddings are good at paraphrases and bad at exact tokens: part numbers,
+form ids ("QA-114"), error codes and acronyms. BM25 is the opposite, so SOP
+Search runs both and fuses the rankings (reciprocal_rank_fusion).
+
+Postings are arrays, not Python lists of objects. What was loaded from disk
+stays in flat CSR arrays (terms -> slice of docs/tfs); chunks added since
+then go to per-term array('i') buffers. Removing a chunk only clears its
+"alive" flag; save() compacts dead rows and merges everything back into
+CSR form.
+"""
+import json
+import math
+import os
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+
+K1 = 1.5
+B = 0.75
+RRF_K = 60  # standard reciprocal rank fusion constant
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this "
+    "to was were will with".split())
+
+
+def tokenize(text):
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower())
+            if len(t) > 1 and t not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Merges ranked id lists: score(id) = sum of 1 / (k + rank). Best first."""
+    scores = Counter()
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] += 1.0 / (k + rank + 1)
+    return [item for item, _ in scores.most_common()]
+
+
+class BM25Index:
+    def __init__(self):
+        self.ids = []            # row -> chunk id
+        self.rows = {}           # chunk id -> row (live rows only)
+        self.lengths = array("i")
+        self.alive = bytearray()
+        self.total_length = 0
+        # Postings loaded from disk (CSR) ...
+        self._terms = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._docs = np.zeros(0, dtype=np.int32)
+        self._tfs = np.zeros(0, dtype=np.int32)
+        # ... and postings added since: term -> (rows, tfs)
+        self._added = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self.rows
+
+    def add(self, ids, texts):
+        """Indexes chunks; an id that is already present is replaced."""
+        for chunk_id, text in zip(ids, texts):
+            self.remove([chunk_id])
+            row = len(self.ids)
+            tokens = tokenize(text)
+            for term, tf in Counter(tokens).items():
+                rows, tfs = self._added.setdefault(term, (array("i"), array("i")))
+                rows.append(row)
+                tfs.append(tf)
+            self.ids.append(chunk_id)
+            self.rows[chunk_id] = row
+            self.lengths.append(len(tokens))
+            self.alive.append(1)
+            self.total_length += len(tokens)
+
+    def remove(self, ids):
+        for chunk_id in ids:
+            row = self.rows.pop(chunk_id, None)
+            if row is not None:
+                self.alive[row] = 0
+                self.total_length -= self.lengths[row]
+
+    def _postings(self, term):
+        parts = []
+        slot = self._terms.get(term)
+        if slot is not None:
+            start, stop = self._offsets[slot], self._offsets[slot + 1]
+            parts.append((self._docs[start:stop], self._tfs[start:stop]))
+        if term in self._added:
+            rows, tfs = self._added[term]
+            parts.append((np.frombuffer(rows, dtype=np.int32), np.frombuffer(tfs, dtype=np.int32)))
+        if not parts:
+            return None, None
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    def search(self, query, k=10):
+        """[(chunk id, score)] for the k best keyword matches, best first."""
+        if not self.rows:
+            return []
+        alive = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+        lengths = np.frombuffer(self.lengths, dtype=np.int32)
+        live = len(self.rows)
+        average = max(self.total_length / live, 1.0)
+
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            docs, tfs = self._postings(term)
+            if docs is None:
+                continue
+            df = int(alive[docs].sum())
+            if not df:
+                continue
+            idf = math.log(1 + (live - df + 0.5) / (df + 0.5))
+            norm = K1 * (1 - B + B * lengths[docs] / average)
+            scores[docs] += idf * tfs * (K1 + 1) / (tfs + norm)
+
+        scores[~alive] = 0
+        hits = np.flatnonzero(scores)
+        if not len(hits):
+            return []
+        k = min(k, len(hits))
+        top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[row], float(scores[row])) for row in top]
+
+    # --- Persistence ---
+    def save(self, path):
+        """Compacts dead rows, merges postings into CSR and writes one .npz file."""
+        alive = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+        renumber = np.cumsum(alive, dtype=np.int64) - 1
+
+        terms, offsets, docs, tfs = [], [0], [], []
+        for term in set(self._terms) | set(self._added):
+            term_docs, term_tfs = self._postings(term)
+            keep = alive[term_docs]
+            if not keep.any():
+                continue
+            terms.append(term)
+            docs.append(renumber[term_docs[keep]].astype(np.int32))
+            tfs.append(term_tfs[keep])
+            offsets.append(offsets[-1] + int(keep.sum()))
+
+        ids = [chunk_id for chunk_id, ok in zip(self.ids, alive) if ok]
+        lengths = np.frombuffer(self.lengths, dtype=np.int32)[alive]
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, terms=np.array(json.dumps(terms)), ids=np.array(json.dumps(ids)),
+                     offsets=np.array(offsets, dtype=np.int64), lengths=lengths,
+                     docs=np.concatenate(docs) if docs else np.zeros(0, dtype=np.int32),
+                     tfs=np.concatenate(tfs) if tfs else np.zeros(0, dtype=np.int32))
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        index = cls()
+        index.ids = json.loads(str(data["ids"]))
+        index.rows = {chunk_id: row for row, chunk_id in enumerate(index.ids)}
+        index.lengths = array("i", data["lengths"].astype(np.int32).tobytes())
+        index.alive = bytearray(b"\x01" * len(index.ids))
+        index.total_length = int(data["lengths"].sum())
+        index._terms = {term: slot for slot, term in enumerate(json.loads(str(data["terms"])))}
+        index._offsets = data["offsets"]
+        index._docs = data["docs"]
+        index._tfs = data["tfs"]
+        return index
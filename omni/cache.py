@@ -0,0 +1,135 @@
+"""
+Content-addressed cache for Gemini responses.
+
+Entries are keyed on (model, temperature, sha256(prompt)), so the same resume +
+JD combination returns instantly on a rerun instead of spending another request
+from the rate-limit budget. Two tiers:
+
+* a small in-memory LRU for the hot entries of this process
+* a SQLite file on disk so answers survive restarts and are shared between
+  worker processes
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_DIR = os.getenv("OMNI_CACHE_DIR", ".cache")
+RESPONSE_DB = os.path.join(CACHE_DIR, "responses.sqlite3")
+
+# Defaults can be tuned per deployment without touching the code.
+DEFAULT_TTL = int(os.getenv("OMNI_RESPONSE_CACHE_TTL", 24 * 60 * 60))  # seconds
+MAX_MEMORY_ENTRIES = int(os.getenv("OMNI_RESPONSE_CACHE_MEMORY", 256))
+MAX_DISK_ENTRIES = int(os.getenv("OMNI_RESPONSE_CACHE_DISK", 5000))
+
+
+def make_key(model, temperature, prompt):
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return f"{model}|{float(temperature):.3f}|{digest}"
+
+
+class ResponseCache:
+    def __init__(self, path=RESPONSE_DB, ttl=DEFAULT_TTL,
+                 max_memory_entries=MAX_MEMORY_ENTRIES, max_disk_entries=MAX_DISK_ENTRIES):
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()  # key -> (created_at, text)
+        self._lock = threading.Lock()
+
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )""")
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+            self._db.commit()
+
+    def _expired(self, created_at, now):
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def get(self, model, temperature, prompt):
+        key = make_key(model, temperature, prompt)
+        now = time.time()
+
+        with self._lock:
+            # 1. Memory tier
+            hit = self._memory.get(key)
+            if hit is not None:
+                if not self._expired(hit[0], now):
+                    self._memory.move_to_end(key)
+                    return hit[1]
+                del self._memory[key]
+
+            if self._db is None:
+                return None
+
+            # 2. Disk tier
+            row = self._db.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            text, created_at = row
+            if self._expired(created_at, now):
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._remember(key, created_at, text)
+            return text
+
+    def put(self, model, temperature, prompt, text):
+        key = make_key(model, temperature, prompt)
+        now = time.time()
+
+        with self._lock:
+            self._remember(key, now, text)
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, text, now, now))
+            # Size cap: drop the least recently used rows beyond the limit
+            self._db.execute("""
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )""", (self.max_disk_entries,))
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def _remember(self, key, created_at, text):
+        self._memory[key] = (created_at, text)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Returns the process-wide response cache (created on first use)."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
@@ -0,0 +1,143 @@
+"""
+Context budgeting for RAG prompts.
+
+Retrieved chunks overlap. The splitter repeats 100 characters between
+neighbours, the same boilerplate paragraph shows up in several manuals, and
+hybrid search often returns two halves of one page. Pasting them all wastes
+prompt tokens and pushes the useful text further from the question.
+
+pack_context() keeps the chunks in relevance order and:
+
+* drops exact duplicates and chunks contained in a chunk already kept
+* stitches chunks from the same source page whose ends overlap
+* fills up to a token budget, trimming the last piece at a sentence boundary
+  around its best-ranked chunk
+"""
+import os
+
+from omni.ratelimit import estimate_tokens
+from omni.tracing import traced
+
+DEFAULT_BUDGET = int(os.getenv("OMNI_CONTEXT_TOKENS", "3000"))
+RETRIEVE_K = 8  # retrieve generously, let the budget decide what goes in
+MIN_OVERLAP = 20
+MAX_OVERLAP = 400
+MIN_PARTIAL_TOKENS = 60  # don't bother appending a sliver of a chunk
+
+
+def _overlap(first, second):
+    """Length of the longest suffix of `first` that starts `second` (0 if short)."""
+    for size in range(min(len(first), len(second), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+
+def _merge(kept, text):
+    """kept text with `text` stitched onto either end, or None if they don't touch."""
+    size = _overlap(kept, text)
+    if size:
+        return kept + text[size:]
+    size = _overlap(text, kept)
+    if size:
+        return text + kept[size:]
+    return None
+
+
+def _trim(text, tokens):
+    """The longest prefix of text within `tokens`, cut at a sentence end if possible."""
+    cut = text[:max(tokens - 1, 0) * 4]
+    if len(cut) == len(text):
+        return text
+    end = max(cut.rfind(". "), cut.rfind("\n"))
+    if end > len(cut) // 2:
+        return cut[:end + 1]
+    return cut[:cut.rfind(" ")] if " " in cut else cut
+
+
+def _trim_around(text, best, tokens):
+    """(offset, part of text within `tokens`) that starts with the span `best`.
+
+    The window runs forward from the best chunk and only reaches back before
+    it when the text after it is too short to fill the budget.
+    """
+    start = min(best[0], max(len(text) - max(tokens - 1, 0) * 4, 0))
+    if 0 < start < best[0]:
+        # Begin at a word, not halfway through one
+        space = text.find(" ", start, best[0])
+        start = space + 1 if space != -1 else best[0]
+    return start, _trim(text[start:], tokens)
+
+
+@traced("context.pack")
+def pack_context(docs, budget=DEFAULT_BUDGET, separator="\n\n"):
+    """Returns (context text, stats) for relevance-ordered Documents.
+
+    stats: {"tokens", "budget", "chunks", "used", "merged", "duplicates"}, where
+    "used" counts the retrieved chunks whose text made it into the context.
+    """
+    # [(source, page), text, spans]: spans are the (start, end) of each chunk
+    # stitched into the text, in rank order, so spans[0] is the best one
+    pieces = []
+    seen = set()
+    merged = duplicates = 0
+    for doc in docs:
+        text = doc.page_content.strip()
+        normalized = " ".join(text.split())
+        if not text or normalized in seen:
+            duplicates += 1
+            continue
+        seen.add(normalized)
+
+        key = (doc.metadata.get("source"), doc.metadata.get("page"))
+        for piece in pieces:
+            if piece[0] != key:
+                continue
+            if text in piece[1]:
+                duplicates += 1
+                break
+            if piece[1] in text:
+                # The new chunk covers the piece: everything in it moves along
+                offset = text.index(piece[1])
+                piece[2] = [(a + offset, b + offset) for a, b in piece[2]] + [(0, len(text))]
+                piece[1] = text
+                break
+            joined = _merge(piece[1], text)
+            if joined:
+                if joined.startswith(piece[1]):
+                    piece[2].append((len(joined) - len(text), len(joined)))
+                else:
+                    shift = len(joined) - len(piece[1])
+                    piece[2] = [(a + shift, b + shift) for a, b in piece[2]] + [(0, len(text))]
+                piece[1] = joined
+                merged += 1
+                break
+        else:
+            pieces.append([key, text, [(0, len(text))]])
+
+    parts, used, chunks = [], 0, 0
+    for _, text, spans in pieces:
+        cost = estimate_tokens(text + separator)
+        if used + cost <= budget:
+            parts.append(text)
+            used += cost
+            chunks += len(spans)
+        elif budget - used >= MIN_PARTIAL_TOKENS:
+            start, part = _trim_around(text, spans[0], budget - used)
+            parts.append(part)
+            # The best chunk, and any other chunk at least half inside the window
+            end = start + len(part)
+            chunks += 1 + sum(2 * (min(b, end) - max(a, start)) >= b - a for a, b in spans[1:])
+            break
+        else:
+            break
+
+    context = separator.join(parts)
+    return context, {
+        "tokens": estimate_tokens(context) if parts else 0,
+        "budget": budget,
+        "chunks": len(docs),
+        "used": chunks,
+        "merged": merged,
+        "duplicates": duplicates,
+    }
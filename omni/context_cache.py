@@ -0,0 +1,80 @@
+"""
+Gemini context caching for "chat with the whole corpus" scripts.
+
+Instead of resending every document with every question, the corpus is
+uploaded once as cached content and each question only references it by
+name. Cache names are remembered per corpus hash in .cache/, so a rerun on
+the same PDFs reuses the cache until it expires.
+
+LocalCaches mirrors the slice of `client.caches` used here (create / get /
+delete) in memory. It stands in when the API has no caching (free tier,
+offline runs); callers then inline the stored instruction themselves.
+"""
+import hashlib
+import json
+import os
+import time
+import uuid
+from types import SimpleNamespace
+
+from omni.cache import CACHE_DIR
+
+REGISTRY = os.path.join(CACHE_DIR, "gemini_caches.json")
+DEFAULT_TTL = 3600  # seconds
+
+
+class LocalCaches:
+    def __init__(self):
+        self._caches = {}
+
+    def create(self, model, config):
+        name = f"local/{uuid.uuid4().hex}"
+        self._caches[name] = SimpleNamespace(
+            name=name, model=model, system_instruction=config.system_instruction,
+            expire_time=None)
+        return self._caches[name]
+
+    def get(self, name):
+        if name not in self._caches:
+            raise KeyError(name)
+        return self._caches[name]
+
+    def delete(self, name):
+        self._caches.pop(name, None)
+
+
+def corpus_key(model, system_instruction):
+    return hashlib.sha256(f"{model}\x00{system_instruction}".encode("utf-8")).hexdigest()
+
+
+def _load_registry(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def get_or_create(caches, model, system_instruction, ttl=DEFAULT_TTL, registry=REGISTRY):
+    """Returns (cached content, reused?) for this corpus, creating it only once per TTL."""
+    from google.genai import types
+
+    key = corpus_key(model, system_instruction)
+    known = _load_registry(registry)
+    entry = known.get(key)
+    if entry and entry["expires"] > time.time() + 60:
+        try:
+            return caches.get(name=entry["name"]), True
+        except Exception:
+            pass  # Expired or deleted server-side: create a fresh one
+
+    cache = caches.create(model=model, config=types.CreateCachedContentConfig(
+        display_name=f"corpus-{key[:12]}", system_instruction=system_instruction,
+        ttl=f"{ttl}s"))
+    if not isinstance(caches, LocalCaches):
+        known[key] = {"name": cache.name, "expires": time.time() + ttl}
+        os.makedirs(os.path.dirname(registry), exist_ok=True)
+        with open(registry + ".tmp", "w") as f:
+            json.dump(known, f)
+        os.replace(registry + ".tmp", registry)
+    return cache, False
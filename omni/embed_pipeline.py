@@ -0,0 +1,146 @@
+"""
+Adaptive bulk embedding.
+
+Instead of a fixed 5-chunk batch followed by a fixed sleep, batches are sized
+and dispatched by an AIMD controller (the same idea TCP uses for congestion):
+
+* every fast, successful batch adds a little batch size and concurrency
+* a 429 halves both, and the batch is retried after the backoff delay
+* other failures are retried too — nothing is silently dropped
+
+Completed ids are appended to a checkpoint file as they are stored, so an
+interrupted build picks up where it stopped.
+"""
+import heapq
+import itertools
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from google.api_core.exceptions import ResourceExhausted
+
+from omni.metrics import bind, context
+from omni.retry import get_retry_scheduler
+
+MAX_BATCH = 100        # batchEmbedContents limit
+MAX_ATTEMPTS = 6       # per batch, before the build stops (and can be resumed)
+
+
+class AIMDController:
+    def __init__(self, batch_size=20, min_batch=5, max_batch=MAX_BATCH,
+                 concurrency=2, max_concurrency=8, target_latency=5.0):
+        self.batch_size = batch_size
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+
+    def on_success(self, latency):
+        if latency <= self.target_latency:
+            # Additive increase while the API keeps up
+            self.batch_size = min(self.max_batch, self.batch_size + 10)
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+        else:
+            # Slow but not failing: stop growing concurrency
+            self.concurrency = max(1, self.concurrency - 1)
+
+    def on_rate_limit(self):
+        # Multiplicative decrease
+        self.batch_size = max(self.min_batch, self.batch_size // 2)
+        self.concurrency = max(1, self.concurrency // 2)
+
+
+def load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {json.loads(line) for line in f if line.strip()}
+
+
+def embed_and_store(ids, texts, metadatas, embeddings, store, checkpoint_path=None,
+                    controller=None, on_progress=None):
+    """Embeds texts in adaptive batches and hands each finished batch to store().
+
+    store(ids, vectors, texts, metadatas) runs on the calling thread. ids
+    already in the checkpoint are skipped. on_progress(done, total, controller)
+    is called after every stored batch. Returns the number of texts embedded.
+    """
+    controller = controller or AIMDController()
+    done = load_checkpoint(checkpoint_path)
+    todo = deque(i for i, chunk_id in enumerate(ids) if chunk_id not in done)
+    total = len(ids)
+    completed = total - len(todo)
+    embedded = 0
+
+    retry_queue = []   # heap of (ready_at, seq, positions, attempt)
+    seq = itertools.count()
+    checkpoint = open(checkpoint_path, "a") if checkpoint_path else None
+
+    def next_batch():
+        if retry_queue and retry_queue[0][0] <= time.time():
+            _, _, positions, attempt = heapq.heappop(retry_queue)
+            return positions, attempt
+        if todo:
+            size = min(controller.batch_size, len(todo))
+            return [todo.popleft() for _ in range(size)], 0
+        return None
+
+    @bind
+    def run(positions, attempt):
+        start = time.time()
+        with context(retry=attempt):
+            vectors = embeddings.embed_documents([texts[i] for i in positions])
+        return vectors, time.time() - start
+
+    try:
+        with ThreadPoolExecutor(max_workers=controller.max_concurrency) as pool:
+            in_flight = {}
+            while todo or retry_queue or in_flight:
+                # Fill up to the current concurrency window
+                while len(in_flight) < controller.concurrency:
+                    batch = next_batch()
+                    if batch is None:
+                        break
+                    positions, attempt = batch
+                    in_flight[pool.submit(run, positions, attempt)] = (positions, attempt)
+
+                if not in_flight:
+                    # Only delayed retries left: wait for the earliest one
+                    time.sleep(max(0.0, retry_queue[0][0] - time.time()))
+                    continue
+
+                finished, _ = wait(in_flight, timeout=1.0, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    positions, attempt = in_flight.pop(future)
+                    try:
+                        vectors, latency = future.result()
+                    except Exception as e:
+                        if attempt + 1 >= MAX_ATTEMPTS:
+                            raise
+                        if isinstance(e, ResourceExhausted):
+                            controller.on_rate_limit()
+                        delay = get_retry_scheduler().delay_for(attempt, e)
+                        heapq.heappush(retry_queue,
+                                       (time.time() + delay, next(seq), positions, attempt + 1))
+                        continue
+
+                    batch_ids = [ids[i] for i in positions]
+                    store(batch_ids, vectors, [texts[i] for i in positions],
+                          [metadatas[i] for i in positions])
+                    if checkpoint:
+                        checkpoint.write("".join(json.dumps(i) + "\n" for i in batch_ids))
+                        checkpoint.flush()
+
+                    controller.on_success(latency)
+                    completed += len(positions)
+                    embedded += len(positions)
+                    if on_progress:
+                        on_progress(completed, total, controller)
+    finally:
+        if checkpoint:
+            checkpoint.close()
+
+    return embedded
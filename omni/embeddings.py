@@ -0,0 +1,133 @@
+"""
+Embedding wrappers that plug into any LangChain vector store.
+
+RateLimitedEmbeddings sends texts in API-sized batches and takes each batch
+from the shared "embed" token bucket before it goes out. A batch that can't
+get budget within max_wait seconds raises Throttled instead of blocking.
+
+CachedEmbeddings keeps every vector it has ever fetched in a SQLite file,
+keyed on the model name and a hash of the text. Rebuilding a corpus, or
+indexing boilerplate (headers, disclaimers, TOCs) that repeats across
+manuals, never pays for the same embedding twice.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+from omni.cache import CACHE_DIR
+from omni.metrics import track
+from omni.ratelimit import MAX_QUEUE_WAIT, estimate_tokens, get_rate_limiter
+from omni.tracing import span
+
+EMBEDDING_DB = os.path.join(CACHE_DIR, "embeddings.sqlite3")
+
+# batchEmbedContents accepts up to 100 texts per request
+API_BATCH_SIZE = 100
+
+
+class RateLimitedEmbeddings(Embeddings):
+    def __init__(self, inner, limiter=None, max_wait=MAX_QUEUE_WAIT):
+        self.inner = inner
+        self.limiter = limiter or get_rate_limiter("embed")
+        self.max_wait = max_wait
+
+    @property
+    def model(self):
+        return getattr(self.inner, "model", type(self.inner).__name__)
+
+    def embed_documents(self, texts):
+        vectors = []
+        for i in range(0, len(texts), API_BATCH_SIZE):
+            batch = texts[i: i + API_BATCH_SIZE]
+            self.limiter.acquire(tokens=sum(estimate_tokens(t) for t in batch),
+                                 max_wait=self.max_wait)
+            vectors.extend(self.inner.embed_documents(batch))
+        return vectors
+
+    def embed_query(self, text):
+        self.limiter.acquire(tokens=estimate_tokens(text), max_wait=self.max_wait)
+        return self.inner.embed_query(text)
+
+
+class CachedEmbeddings(Embeddings):
+    # SQLite allows at most 999 bound parameters per statement
+    LOOKUP_CHUNK = 500
+
+    def __init__(self, inner, path=EMBEDDING_DB):
+        self.inner = inner
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        return getattr(self.inner, "model", type(self.inner).__name__)
+
+    def _key(self, kind, text):
+        # Documents and queries are embedded with different task types
+        return hashlib.sha256(f"{self.model}\x00{kind}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), self.LOOKUP_CHUNK):
+                part = keys[i: i + self.LOOKUP_CHUNK]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+        return found
+
+    def _store(self, pairs):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in pairs])
+            self._db.commit()
+
+    def embed_documents(self, texts):
+        keys = [self._key("doc", t) for t in texts]
+        with track("embed", self.model) as call:
+            found = self._lookup(list(set(keys)))
+
+            # Fetch each distinct missing text once, even if it repeats in this batch
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in found and key not in missing:
+                    missing[key] = text
+            if missing:
+                # The embedding API reports no usage, so tokens are estimated
+                call.input_tokens = sum(estimate_tokens(t) for t in missing.values())
+                with span("embed", texts=len(missing)):
+                    vectors = self.inner.embed_documents(list(missing.values()))
+                fetched = list(zip(missing.keys(), vectors))
+                self._store(fetched)
+                found.update(fetched)
+            else:
+                call.cache = "hit"
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        key = self._key("query", text)
+        with track("embed", self.model) as call:
+            found = self._lookup([key])
+            if key in found:
+                call.cache = "hit"
+                return found[key]
+            call.input_tokens = estimate_tokens(text)
+            with span("embed.query"):
+                vector = self.inner.embed_query(text)
+        self._store([(key, vector)])
+        return vector
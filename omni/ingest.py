@@ -0,0 +1,132 @@
+"""
+Parallel PDF ingestion.
+
+pypdf text extraction is pure Python and CPU-bound, so a loop over forty
+manuals uses one core while the rest sit idle. load_pdfs_parallel() fans the
+work out over a process pool: every file is one task, and big files are cut
+into page ranges so a single 500-page manual doesn't become the long pole.
+
+Results come back as the same per-page Documents omni.pdf / PyPDFLoader
+produce, in the original file and page order.
+
+Scripts that call this must keep their top-level code under
+`if __name__ == "__main__":` — worker processes are started with "spawn",
+which re-imports the main module.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+PAGES_PER_TASK = 25       # split files larger than this into page ranges
+MIN_PAGES_FOR_POOL = 16   # below this, starting processes costs more than it saves
+
+
+def _open(data):
+    # data is either a path on disk or the raw bytes of an upload
+    return PdfReader(data if isinstance(data, str) else BytesIO(data))
+
+
+def _extract_pages(data, start, stop):
+    """Worker: text for pages [start, stop) of one PDF."""
+    reader = _open(data)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def count_pages(sources, on_error=None):
+    """{name: page count} for each readable PDF, without extracting any text.
+
+    Only the page tree is read, so this is a cheap way to size a corpus before
+    deciding whether to parse it. on_error(name, error) is called for files
+    that can't be opened; they are left out.
+    """
+    counts = {}
+    for name, data in [(s, s) if isinstance(s, str) else s for s in sources]:
+        try:
+            counts[name] = len(_open(data).pages)
+        except Exception as e:
+            if on_error:
+                on_error(name, e)
+    return counts
+
+
+def load_pdfs_parallel(sources, max_workers=None, on_progress=None):
+    """Loads many PDFs at once and returns their page Documents in order.
+
+    sources: file paths, or (name, data) pairs where data is bytes or a path.
+    on_progress(name, num_pages, error) is called on the calling thread as each
+    file finishes; files that fail are reported there and skipped.
+    """
+    files = [(s, s) if isinstance(s, str) else s for s in sources]
+
+    # 1. Plan: count pages (cheap, no text extraction) and cut into tasks
+    tasks = []   # (file_index, start, stop)
+    page_counts = {}
+    errors = {}
+    for index, (name, data) in enumerate(files):
+        try:
+            count = len(_open(data).pages)
+        except Exception as e:
+            errors[index] = e
+            continue
+        page_counts[index] = count
+        for start in range(0, count, PAGES_PER_TASK):
+            tasks.append((index, start, min(start + PAGES_PER_TASK, count)))
+
+    texts = {index: [None] * count for index, count in page_counts.items()}
+    pending = {index: 0 for index in page_counts}
+    for index, _, _ in tasks:
+        pending[index] += 1
+
+    for index, error in errors.items():
+        if on_progress:
+            on_progress(files[index][0], 0, error)
+
+    def finish(index, start, result=None, error=None):
+        if error is not None:
+            if index not in errors:
+                errors[index] = error
+                if on_progress:
+                    on_progress(files[index][0], 0, error)
+            return
+        texts[index][start: start + len(result)] = result
+        pending[index] -= 1
+        if pending[index] == 0 and index not in errors and on_progress:
+            on_progress(files[index][0], page_counts[index], None)
+
+    # 2. Extract: inline for small jobs, across processes otherwise
+    total_pages = sum(page_counts.values())
+    if len(tasks) <= 1 or total_pages < MIN_PAGES_FOR_POOL:
+        for index, start, stop in tasks:
+            try:
+                finish(index, start, _extract_pages(files[index][1], start, stop))
+            except Exception as e:
+                finish(index, start, error=e)
+    else:
+        workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+        # "spawn" is safe inside threaded servers like Streamlit (fork isn't)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = {
+                pool.submit(_extract_pages, files[index][1], start, stop): (index, start)
+                for index, start, stop in tasks
+            }
+            for future in as_completed(futures):
+                index, start = futures[future]
+                try:
+                    finish(index, start, future.result())
+                except Exception as e:
+                    finish(index, start, error=e)
+
+    # 3. Assemble in the original order, with PyPDFLoader-style metadata
+    documents = []
+    for index, (name, _) in enumerate(files):
+        if index in errors or index not in texts:
+            continue
+        for page, text in enumerate(texts[index]):
+            documents.append(Document(page_content=text,
+                                      metadata={"source": name, "page": page}))
+    return documents
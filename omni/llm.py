@@ -0,0 +1,180 @@
+"""
+Process-wide Gemini client pool.
+
+Streamlit re-executes the app script on every interaction, but imported modules
+live for the whole server process. Keeping the clients here means every session
+that uses the same API key shares one warm gRPC channel instead of paying for a
+new client (and a new TLS handshake) on each call.
+
+The API key is handed straight to the client, so nothing touches
+os.environ["GOOGLE_API_KEY"] and concurrent sessions with different keys can't
+race each other.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from google.api_core.exceptions import ResourceExhausted
+from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
+
+from omni.cache import get_response_cache
+from omni.embeddings import CachedEmbeddings, RateLimitedEmbeddings
+from omni.metrics import context, track
+from omni.ratelimit import MAX_QUEUE_WAIT, estimate_tokens, get_rate_limiter
+from omni.retry import get_retry_scheduler
+from omni.tracing import span
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+# How many distinct (key, model) clients we keep warm before evicting the oldest.
+MAX_POOLED_CLIENTS = 32
+
+_pool = OrderedDict()
+_pool_lock = threading.Lock()
+
+
+def _pooled(key, factory):
+    with _pool_lock:
+        client = _pool.get(key)
+        if client is not None:
+            _pool.move_to_end(key)
+            return client
+
+    # Build outside the lock so a slow client doesn't block other sessions.
+    client = factory()
+
+    with _pool_lock:
+        # Another thread may have won the race; keep the first one.
+        existing = _pool.get(key)
+        if existing is not None:
+            return existing
+        _pool[key] = client
+        while len(_pool) > MAX_POOLED_CLIENTS:
+            _pool.popitem(last=False)
+    return client
+
+
+def get_chat_model(api_key, model=DEFAULT_MODEL, temperature=0.3):
+    """Returns a chat model for this key, reusing the pooled client."""
+    # One client per (key, model). Temperature is applied per call through
+    # generation_config, so different temperatures share the same channel.
+    llm = _pooled(
+        ("chat", api_key, model),
+        lambda: ChatGoogleGenerativeAI(model=model, google_api_key=api_key),
+    )
+    return llm.bind(generation_config={"temperature": temperature})
+
+
+def get_embeddings(api_key, model=EMBEDDING_MODEL, max_wait=MAX_QUEUE_WAIT):
+    """Returns the pooled embeddings client for this key.
+
+    Lookups hit the on-disk embedding cache first; only misses go through the
+    shared limiter to the API, raising Throttled if it can't grant budget
+    within max_wait seconds (None waits as long as it takes).
+    """
+    return _pooled(
+        ("embed", api_key, model, max_wait),
+        lambda: CachedEmbeddings(RateLimitedEmbeddings(
+            GoogleGenerativeAIEmbeddings(model=model, google_api_key=api_key),
+            max_wait=max_wait)),
+    )
+
+
+def _acquire(prompt, max_wait):
+    # Shared 429 cooldown first, then our own RPM/TPM budget
+    get_retry_scheduler().check()
+    get_rate_limiter("chat").acquire(tokens=estimate_tokens(prompt), max_wait=max_wait)
+
+
+def generate(api_key, prompt, model=DEFAULT_MODEL, temperature=0.3, use_cache=True,
+             max_wait=MAX_QUEUE_WAIT, backoff=True):
+    """Returns the completion text for a prompt, served from the cache when possible.
+
+    Errors are raised to the caller and never cached. While the shared
+    rate-limit cooldown is active, or the limiter can't grant budget within
+    max_wait seconds, this raises CoolingDown (a ResourceExhausted) without
+    touching the API. With backoff=False a 429 is raised without starting the
+    shared cooldown, for optional calls that must not hold up the main one.
+    """
+    cache = get_response_cache() if use_cache else None
+    with track("chat", model) as call, span("generate", model=model) as stage:
+        if cache is not None:
+            cached = cache.get(model, temperature, prompt)
+            if cached is not None:
+                call.cache = "hit"
+                stage.set(cache="hit")
+                return cached
+
+        _acquire(prompt, max_wait)
+        try:
+            message = get_chat_model(api_key, model=model, temperature=temperature).invoke(prompt)
+        except ResourceExhausted as e:
+            if backoff:
+                get_retry_scheduler().record(e)
+            raise
+        call.usage(message.usage_metadata)
+        text = message.content
+
+    if cache is not None:
+        cache.put(model, temperature, prompt, text)
+    return text
+
+
+def generate_with_backoff(api_key, prompt, model=DEFAULT_MODEL, temperature=0.3,
+                          attempts=4, max_wait=60.0):
+    """generate() for background workers: sleeps through 429s instead of raising.
+
+    Uses the shared backoff, so every worker respects the same cooldown. Only
+    the last ResourceExhausted is raised.
+    """
+    scheduler = get_retry_scheduler()
+    for attempt in range(attempts):
+        try:
+            with context(retry=attempt):
+                return generate(api_key, prompt, model=model, temperature=temperature,
+                                max_wait=max_wait)
+        except ResourceExhausted as e:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(scheduler.delay_for(attempt, e))
+
+
+def stream(api_key, prompt, model=DEFAULT_MODEL, temperature=0.3, use_cache=True,
+           max_wait=MAX_QUEUE_WAIT):
+    """Yields the completion as text chunks while Gemini generates it.
+
+    A cache hit yields the stored answer in one piece. The assembled text is
+    cached only once the stream has finished, so an interrupted stream never
+    leaves a truncated answer behind.
+    """
+    cache = get_response_cache() if use_cache else None
+    parts = []
+    with track("stream", model) as call, span("generate", model=model) as stage:
+        if cache is not None:
+            cached = cache.get(model, temperature, prompt)
+            if cached is not None:
+                call.cache = "hit"
+                stage.set(cache="hit")
+                call.first_token()
+                yield cached
+                return
+
+        _acquire(prompt, max_wait)
+        try:
+            for chunk in get_chat_model(api_key, model=model, temperature=temperature).stream(prompt):
+                # Chunks carry running totals; the last one holds the final count
+                call.usage(chunk.usage_metadata)
+                if chunk.content:
+                    call.first_token()
+                    parts.append(chunk.content)
+                    yield chunk.content
+        except ResourceExhausted as e:
+            get_retry_scheduler().record(e)
+            raise
+        if call.output_tokens is None:
+            call.input_tokens = estimate_tokens(prompt)
+            call.output_tokens = estimate_tokens("".join(parts))
+
+    if cache is not None:
+        cache.put(model, temperature, prompt, "".join(parts))
@@ -0,0 +1,114 @@
+"""
+Map-reduce summarization for transcript sets too big for one prompt.
+
+1. Map: each transcript is split into ~3k-token parts and every part is
+   summarized on its own, several at a time. Transcripts are read lazily and
+   only a few parts are in flight, so memory holds summaries, not the corpus.
+2. Reduce: summaries are merged FAN_IN at a time, level by level, until at
+   most FAN_IN remain for the caller's final (streamed) prompt.
+
+Every call goes through omni.llm.generate_with_backoff, so the shared rate
+limiter, retry cooldown and response cache all apply: a rerun after a
+failure only pays for the parts that hadn't finished.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from omni.llm import DEFAULT_MODEL, generate_with_backoff
+from omni.metrics import bind
+
+PART_CHARS = 12_000  # ~3k tokens per map call
+FAN_IN = 8
+MAX_WORKERS = 4
+
+MAP_PROMPT = """You are analyzing one part of a transcript or log for this goal:
+{goal}
+
+Summarize the facts, recurring themes, complaints, requests and notable quotes
+in this part in at most 200 words of bullet points. Keep counts and names.
+
+SOURCE: {name} (part {part})
+---
+{text}"""
+
+REDUCE_PROMPT = """Merge these partial analyses into one, for this goal:
+{goal}
+
+Combine duplicates, keep counts and which sources a theme came from, and
+drop nothing that recurs. At most 300 words of bullet points.
+
+{summaries}"""
+
+
+def map_reduce(api_key, documents, goal, model=DEFAULT_MODEL, max_workers=MAX_WORKERS,
+               fan_in=FAN_IN, on_progress=None):
+    """Condenses (name, text) pairs into at most `fan_in` summaries, in document order.
+
+    documents is consumed lazily. A corpus that fits in a single part is
+    returned as-is (no map call). on_progress(message) is called on the
+    caller's thread, so it may update Streamlit elements.
+    """
+    report = on_progress or (lambda message: None)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=PART_CHARS, chunk_overlap=0)
+    summarize = bind(generate_with_backoff)  # workers' calls count toward the caller's module
+    results = {}
+    pending = {}
+    held = None  # first part, sent only once we know there is a second one
+    submitted = 0
+    read = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        def drain(limit):
+            while len(pending) > limit:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    try:
+                        results[index] = future.result()
+                    except Exception:
+                        for other in pending:
+                            other.cancel()
+                        raise
+                report(f"Summarized {len(results)}/{submitted} parts "
+                       f"from {read} transcripts...")
+
+        def submit(name, part, text):
+            nonlocal submitted
+            drain(max_workers * 2 - 1)
+            prompt = MAP_PROMPT.format(goal=goal, name=name, part=part, text=text)
+            pending[pool.submit(summarize, api_key, prompt, model)] = submitted
+            submitted += 1
+
+        # 1. MAP
+        for name, text in documents:
+            read += 1
+            for part, chunk in enumerate(splitter.split_text(text or ""), start=1):
+                if held is None and not submitted:
+                    held = (name, part, chunk)
+                    continue
+                if held is not None:
+                    submit(*held)
+                    held = None
+                submit(name, part, chunk)
+            report(f"Read {read} transcripts, {submitted} parts queued...")
+
+        if held is not None:
+            return [f"SOURCE: {held[0]}\n{held[2]}"]
+        drain(0)
+        level = [results[i] for i in range(submitted)]
+
+        # 2. REDUCE, one tree level at a time
+        depth = 0
+        while len(level) > fan_in:
+            depth += 1
+            groups = [level[i:i + fan_in] for i in range(0, len(level), fan_in)]
+            report(f"Merging {len(level)} summaries into {len(groups)} (level {depth})...")
+            futures = [pool.submit(summarize, api_key,
+                                   REDUCE_PROMPT.format(goal=goal, summaries="\n\n---\n\n".join(g)),
+                                   model)
+                       for g in groups]
+            level = [future.result() for future in futures]
+
+    report(f"Condensed {read} transcripts ({submitted} parts) into {len(level)} summaries")
+    return level
@@ -0,0 +1,204 @@
+"""
+Per-call metrics for every Gemini chat and embedding request.
+
+omni.llm and omni.embeddings wrap each call in track(), which records one
+row: wall time, time to first token (streams), input / output tokens from
+the response's usage metadata, whether the response cache answered, and
+which retry attempt it was. Rows go to two places:
+
+* a ring buffer of the last RING_SIZE calls in this process, for the Perf
+  module's live view
+* an append-only JSONL log (OMNI_METRICS_LOG), shared by every process and
+  app, for offline latency and unit-economics analysis
+
+Rows are tagged with the calling app module through a context variable:
+set_context(module="SOP Search") once per rerun, then everything called
+from that thread is attributed to it. Context variables don't follow work
+into thread pools, so wrap pool callables with bind(). OMNI_METRICS=0
+turns recording off.
+"""
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from omni.cache import CACHE_DIR
+
+ENABLED = os.getenv("OMNI_METRICS", "1") != "0"
+METRICS_LOG = os.getenv("OMNI_METRICS_LOG", os.path.join(CACHE_DIR, "llm_calls.jsonl"))
+RING_SIZE = int(os.getenv("OMNI_METRICS_RING", 2000))
+
+_context = contextvars.ContextVar("omni_metrics_context", default={})
+
+
+def set_context(**fields):
+    """Tags later calls on this thread (module=..., retry=...)."""
+    _context.set({**_context.get(), **fields})
+
+
+@contextmanager
+def context(**fields):
+    """set_context() for a block only."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def bind(fn):
+    """fn, carrying the caller's module / retry tags into a worker thread."""
+    fields = _context.get()
+
+    def bound(*args, **kwargs):
+        with context(**fields):
+            return fn(*args, **kwargs)
+    return bound
+
+
+class Call:
+    """One request in flight; track() yields it for the caller to fill in."""
+
+    def __init__(self, kind, model):
+        self.kind = kind
+        self.model = model
+        self.started = time.perf_counter()
+        self.ttft_ms = None
+        self.input_tokens = None
+        self.output_tokens = None
+        self.cache = "miss"
+
+    def first_token(self):
+        if self.ttft_ms is None:
+            self.ttft_ms = (time.perf_counter() - self.started) * 1000
+
+    def usage(self, metadata):
+        """Token counts from a LangChain usage_metadata dict (None is ignored)."""
+        if metadata:
+            self.input_tokens = metadata.get("input_tokens", self.input_tokens)
+            self.output_tokens = metadata.get("output_tokens", self.output_tokens)
+
+
+class MetricsLog:
+    def __init__(self, path=METRICS_LOG, ring_size=RING_SIZE):
+        self.path = path
+        self._ring = deque(maxlen=ring_size)
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def record(self, row):
+        line = json.dumps(row, ensure_ascii=False)
+        with self._lock:
+            self._ring.append(row)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+    def recent(self):
+        """This process's last calls, oldest first."""
+        with self._lock:
+            return list(self._ring)
+
+    def read(self, limit=RING_SIZE * 10):
+        """The last `limit` rows of the shared log (every process)."""
+        if not self.path or not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding="utf-8") as f:
+            lines = deque(f, maxlen=limit)
+        rows = []
+        for line in lines:
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                continue  # a line cut short by a concurrent writer
+        return rows
+
+
+_metrics_log = None
+_metrics_log_lock = threading.Lock()
+
+
+def get_metrics_log():
+    global _metrics_log
+    with _metrics_log_lock:
+        if _metrics_log is None:
+            _metrics_log = MetricsLog()
+        return _metrics_log
+
+
+@contextmanager
+def track(kind, model):
+    """Times the block as one `kind` call ("chat", "stream", "embed") to `model`.
+
+    Exceptions are recorded by type name and re-raised.
+    """
+    call = Call(kind, model)
+    error = None
+    try:
+        yield call
+    except GeneratorExit:
+        error = "cancelled"  # a stream the caller stopped reading
+        raise
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        if ENABLED:
+            fields = _context.get()
+            get_metrics_log().record({
+                "ts": round(time.time(), 3),
+                "module": fields.get("module", "other"),
+                "kind": kind,
+                "model": model,
+                "wall_ms": round((time.perf_counter() - call.started) * 1000, 1),
+                "ttft_ms": None if call.ttft_ms is None else round(call.ttft_ms, 1),
+                "input_tokens": call.input_tokens,
+                "output_tokens": call.output_tokens,
+                "cache": call.cache,
+                "retry": fields.get("retry", 0),
+                "error": error,
+            })
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0-100) of a list, None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def summary(rows):
+    """One dict per (module, kind): call counts, latency percentiles, token averages."""
+    groups = {}
+    for row in rows:
+        groups.setdefault((row.get("module", "other"), row.get("kind")), []).append(row)
+
+    table = []
+    for (module, kind), calls in sorted(groups.items(), key=lambda item: tuple(map(str, item[0]))):
+        # Latency and tokens describe real API calls; cache hits are counted separately
+        misses = [c for c in calls if c.get("cache") != "hit" and not c.get("error")]
+        wall = [c["wall_ms"] for c in misses]
+        ttft = [c["ttft_ms"] for c in misses if c.get("ttft_ms") is not None]
+        tokens_in = [c["input_tokens"] for c in misses if c.get("input_tokens") is not None]
+        tokens_out = [c["output_tokens"] for c in misses if c.get("output_tokens") is not None]
+        table.append({
+            "module": module,
+            "kind": kind,
+            "calls": len(calls),
+            "cache_hit_rate": round(sum(c.get("cache") == "hit" for c in calls) / len(calls), 2),
+            "errors": sum(bool(c.get("error")) for c in calls),
+            "retries": sum((c.get("retry") or 0) > 0 for c in calls),
+            "p50_ms": percentile(wall, 50),
+            "p95_ms": percentile(wall, 95),
+            "p50_ttft_ms": percentile(ttft, 50),
+            "avg_input_tokens": round(sum(tokens_in) / len(tokens_in)) if tokens_in else None,
+            "avg_output_tokens": round(sum(tokens_out) / len(tokens_out)) if tokens_out else None,
+            "total_tokens": sum(tokens_in) + sum(tokens_out),
+        })
+    return table
@@ -0,0 +1,79 @@
+"""
+PDF ingestion straight from memory.
+
+Uploads already arrive as an in-memory buffer, so there's no reason to write
+them to disk just so PyPDFLoader can read them back (and concurrent sessions
+used to overwrite each other's temp_pdf.pdf). The Documents produced here
+have the same shape as PyPDFLoader's: one per page, with "source" and "page"
+metadata, so they drop straight into the text splitter.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+# Upper bound on extracted text kept in memory (characters, across all files)
+TEXT_CACHE_MAX_CHARS = 32_000_000
+
+_text_cache = OrderedDict()  # sha256 of the file -> extracted text
+_text_cache_chars = 0
+_text_cache_lock = threading.Lock()
+
+
+def load_pdf(data, source):
+    """Parses PDF bytes (bytes, memoryview or a file-like object) into page Documents."""
+    if hasattr(data, "read"):
+        data.seek(0)
+        stream = data
+    else:
+        stream = BytesIO(data)
+
+    reader = PdfReader(stream)
+    return [
+        Document(page_content=page.extract_text() or "",
+                 metadata={"source": source, "page": i})
+        for i, page in enumerate(reader.pages)
+    ]
+
+
+def load_uploaded_pdf(uploaded_file):
+    """Page Documents for a Streamlit UploadedFile, without touching the filesystem."""
+    return load_pdf(uploaded_file.getbuffer(), uploaded_file.name)
+
+
+def extract_text(uploaded_file):
+    """Full text of an uploaded PDF, pages joined by newlines."""
+    return "\n".join(page.page_content for page in load_uploaded_pdf(uploaded_file))
+
+
+def extract_text_cached(uploaded_file):
+    """Like extract_text, but memoized on the SHA-256 of the file's bytes.
+
+    Streamlit reruns the script on every click and keystroke, and the upload
+    widget hands back the same file each time. An unchanged file now costs one
+    hash instead of a full pypdf parse. The cache is shared by every session
+    and evicts least-recently-used text beyond TEXT_CACHE_MAX_CHARS.
+    """
+    global _text_cache_chars
+    buffer = uploaded_file.getbuffer()
+    digest = hashlib.sha256(buffer).hexdigest()
+
+    with _text_cache_lock:
+        text = _text_cache.get(digest)
+        if text is not None:
+            _text_cache.move_to_end(digest)
+            return text
+
+    text = "\n".join(page.page_content for page in load_pdf(buffer, uploaded_file.name))
+
+    with _text_cache_lock:
+        if digest not in _text_cache:
+            _text_cache[digest] = text
+            _text_cache_chars += len(text)
+        while _text_cache_chars > TEXT_CACHE_MAX_CHARS and len(_text_cache) > 1:
+            _, evicted = _text_cache.popitem(last=False)
+            _text_cache_chars -= len(evicted)
+    return text
@@ -0,0 +1,182 @@
+"""
+Structured resume / job description profiles, extracted once per document.
+
+Gap Analysis, the resume rewrite and the cover letter all used to resend the
+raw resume and JD, and the model re-parsed them every time. Instead, each
+document is turned into a small JSON profile (skills, roles, dates,
+requirements) by one extraction call. The profile is stored in SQLite under
+the SHA-256 of the document text, so every later prompt, in every session,
+gets the compact form for free.
+
+Extraction failures are never cached; callers fall back to the raw text.
+Extraction is an optimization, so on the interactive path it never queues on
+the limiter, never starts the shared 429 cooldown, and is skipped while one
+is active.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from omni.cache import CACHE_DIR
+from omni.llm import DEFAULT_MODEL, MAX_QUEUE_WAIT, generate
+from omni.metrics import bind
+from omni.retry import get_retry_scheduler
+
+PROFILE_DB = os.path.join(CACHE_DIR, "profiles.sqlite3")
+SCHEMA_VERSION = 1  # bump when the extraction prompts change
+
+PROMPTS = {
+    "resume": """Extract this resume into JSON with exactly these keys:
+{{"name": str, "headline": str, "skills": [str],
+  "roles": [{{"title": str, "company": str, "start": "YYYY-MM" or "", "end": "YYYY-MM" or "present",
+             "highlights": [str]}}],
+  "education": [str], "certifications": [str]}}
+Keep at most 4 highlights per role, copied with their numbers and wording intact.
+Return only the JSON.
+
+RESUME:
+{text}""",
+    "jd": """Extract this job description into JSON with exactly these keys:
+{{"title": str, "company": str, "seniority": str, "location": str,
+  "required_skills": [str], "preferred_skills": [str],
+  "responsibilities": [str], "requirements": [str]}}
+Requirements include years of experience, degrees, certifications and clearances.
+Return only the JSON.
+
+JOB DESCRIPTION:
+{text}""",
+}
+
+
+class ProfileCache:
+    def __init__(self, path=PROFILE_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS profiles (key TEXT PRIMARY KEY, profile TEXT NOT NULL)")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT profile FROM profiles WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, profile):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO profiles (key, profile) VALUES (?, ?)",
+                             (key, json.dumps(profile)))
+            self._db.commit()
+
+
+_profile_cache = None
+_profile_cache_lock = threading.Lock()
+
+
+def get_profile_cache():
+    global _profile_cache
+    with _profile_cache_lock:
+        if _profile_cache is None:
+            _profile_cache = ProfileCache()
+        return _profile_cache
+
+
+def content_key(kind, text, model=DEFAULT_MODEL):
+    return hashlib.sha256(
+        f"{SCHEMA_VERSION}\x00{model}\x00{kind}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def parse_json(raw):
+    """The first JSON object in a model reply (tolerates ```json fences), or None."""
+    match = re.search(r"\{.*\}", raw, re.DOTALL)
+    if not match:
+        return None
+    try:
+        value = json.loads(match.group(0))
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def cached_profile(text, kind, model=DEFAULT_MODEL):
+    """The stored profile for a document, without calling the API (None if absent)."""
+    return get_profile_cache().get(content_key(kind, text, model))
+
+
+def extract_profile(api_key, text, kind, model=DEFAULT_MODEL, max_wait=MAX_QUEUE_WAIT,
+                    backoff=True):
+    """The document's profile dict, extracted on first sight. None if unparseable.
+
+    max_wait and backoff are passed to omni.llm.generate().
+    """
+    key = content_key(kind, text, model)
+    cache = get_profile_cache()
+    profile = cache.get(key)
+    if profile is not None:
+        return profile
+
+    raw = generate(api_key, PROMPTS[kind].format(text=text), model=model,
+                   temperature=0.0, max_wait=max_wait, backoff=backoff)
+    profile = parse_json(raw)
+    if profile is not None:
+        cache.put(key, profile)
+    return profile
+
+
+def _join(items):
+    return "; ".join(str(i) for i in items or [] if i)
+
+
+def compact(profile, kind):
+    """A few dense lines for prompts, far shorter than the source document."""
+    if kind == "resume":
+        lines = [f"CANDIDATE: {profile.get('name', '')} — {profile.get('headline', '')}",
+                 f"SKILLS: {_join(profile.get('skills'))}",
+                 "EXPERIENCE:"]
+        for role in profile.get("roles") or []:
+            dates = f"{role.get('start', '')}–{role.get('end', '')}".strip("–")
+            lines.append(f"- {role.get('title', '')}, {role.get('company', '')} ({dates}): "
+                         f"{_join(role.get('highlights'))}")
+        lines.append(f"EDUCATION: {_join(profile.get('education'))}")
+        if profile.get("certifications"):
+            lines.append(f"CERTIFICATIONS: {_join(profile.get('certifications'))}")
+        return "\n".join(lines)
+
+    return "\n".join([
+        f"ROLE: {profile.get('title', '')} at {profile.get('company', '')} "
+        f"({profile.get('seniority', '')}, {profile.get('location', '')})",
+        f"REQUIRED SKILLS: {_join(profile.get('required_skills'))}",
+        f"PREFERRED SKILLS: {_join(profile.get('preferred_skills'))}",
+        f"RESPONSIBILITIES: {_join(profile.get('responsibilities'))}",
+        f"REQUIREMENTS: {_join(profile.get('requirements'))}",
+    ])
+
+
+def compact_views(api_key, resume_text, jd_text):
+    """(resume, jd) as compact profiles, extracted concurrently; raw text on failure.
+
+    During a rate-limit cooldown only stored profiles are used, so the caller's
+    main request isn't competing with extraction calls.
+    """
+    cooling_down = get_retry_scheduler().cooldown_remaining() > 0
+
+    def view(text, kind):
+        if cooling_down:
+            profile = cached_profile(text, kind)
+        else:
+            try:
+                profile = extract_profile(api_key, text, kind, max_wait=0, backoff=False)
+            except Exception:
+                profile = None  # rate limited or unreachable: the raw text still works
+        return compact(profile, kind) if profile else text
+
+    view = bind(view)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        resume = pool.submit(view, resume_text, "resume")
+        jd = pool.submit(view, jd_text, "jd")
+        return resume.result(), jd.result()
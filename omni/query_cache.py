@@ -0,0 +1,95 @@
+"""
+LRU caches for retrieval.
+
+Operators ask the same handful of questions ("what is the closing
+procedure?") all day. Two small in-process caches make repeats free:
+
+* query embeddings, keyed on (embedding model, normalized query)
+* top-k results, keyed on (index, index version, normalized query, k)
+
+The index version changes whenever the collection is re-indexed, so stale
+results are never served; they simply age out of the LRU.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+from omni.tracing import span
+
+MAX_EMBEDDINGS = 2048
+MAX_RESULTS = 1024
+
+
+def normalize_query(query):
+    """Case, spacing and trailing punctuation don't change the question."""
+    return re.sub(r"\s+", " ", query).strip().strip("?!.").strip().lower()
+
+
+class _LRU:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def discard(self, predicate):
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+
+class QueryCache:
+    def __init__(self, max_embeddings=MAX_EMBEDDINGS, max_results=MAX_RESULTS):
+        self.embeddings = _LRU(max_embeddings)
+        self.results = _LRU(max_results)
+
+    def search(self, store, embeddings, index_key, version, query, k=4, retrieve=None):
+        """similarity_search(query, k) on `store`, skipping work for repeat questions.
+
+        retrieve(normalized query, query vector, k) replaces the plain vector
+        search, e.g. for hybrid keyword + vector retrieval.
+        """
+        normalized = normalize_query(query)
+        result_key = (index_key, version, normalized, k)
+        docs = self.results.get(result_key)
+        if docs is not None:
+            return list(docs)
+
+        model = getattr(embeddings, "model", type(embeddings).__name__)
+        vector = self.embeddings.get((model, normalized))
+        if vector is None:
+            vector = embeddings.embed_query(normalized)
+            self.embeddings.put((model, normalized), vector)
+
+        if retrieve is None:
+            with span("retrieve.vector", k=k):
+                docs = store.similarity_search_by_vector(vector, k=k)
+        else:
+            docs = retrieve(normalized, vector, k)
+        self.results.put(result_key, tuple(docs))
+        return docs
+
+    def invalidate(self, index_key):
+        """Drops cached results for one index (embeddings stay valid)."""
+        self.results.discard(lambda key: key[0] == index_key)
+
+
+_query_cache = QueryCache()
+
+
+def get_query_cache():
+    """Returns the process-wide query cache."""
+    return _query_cache
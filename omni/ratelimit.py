@@ -0,0 +1,169 @@
+"""
+Process-wide token-bucket rate limiter.
+
+Gemini enforces requests-per-minute (RPM) and tokens-per-minute (TPM) quotas
+per API project, not per browser session. Every chat and embedding call goes
+through one of these limiters so the whole server stays under the quota
+together.
+
+* Two buckets per limiter: requests and tokens, both refilled continuously.
+* Waiters are served first-come, first-served, so one busy session can't
+  starve the others.
+* Optionally the bucket levels live in a file guarded by an exclusive lock,
+  so several server processes on the same machine share one budget.
+"""
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to process-local buckets
+    fcntl = None
+
+from omni.retry import CoolingDown
+
+# Free-tier style defaults, overridable per deployment
+LIMITS = {
+    "chat": (int(os.getenv("OMNI_CHAT_RPM", 15)), int(os.getenv("OMNI_CHAT_TPM", 250_000))),
+    "embed": (int(os.getenv("OMNI_EMBED_RPM", 1500)), int(os.getenv("OMNI_EMBED_TPM", 1_000_000))),
+}
+# Set to a path (e.g. .cache/ratelimit) to share budgets between processes
+STATE_DIR = os.getenv("OMNI_LIMITER_DIR")
+# How long a call may queue for rate-limit budget before giving up with
+# Throttled. Keeps the Streamlit script thread from blocking; background
+# workers pass max_wait=None to wait as long as it takes.
+MAX_QUEUE_WAIT = float(os.getenv("OMNI_LIMITER_MAX_WAIT", 5))
+
+
+class Throttled(CoolingDown):
+    """Raised when the local budget can't be granted within max_wait."""
+
+    def __init__(self, remaining):
+        super().__init__(remaining)
+        self.message = f"Local rate limit reached, retry in {remaining:.1f}s"
+
+
+def estimate_tokens(text):
+    # Rough rule of thumb for English: ~4 characters per token
+    return len(text) // 4 + 1
+
+
+class TokenBucketLimiter:
+    def __init__(self, rpm, tpm, state_file=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.state_file = state_file if fcntl is not None else None
+        self._cond = threading.Condition()
+        self._tickets = itertools.count()
+        self._queue = deque()
+        self._state = {"requests": float(rpm), "tokens": float(tpm), "updated": time.time()}
+
+    def acquire(self, tokens=0, requests=1, max_wait=None):
+        """Blocks until the budget is available, in arrival order.
+
+        Raises Throttled if it would take longer than max_wait seconds.
+        """
+        # A single request bigger than the bucket would otherwise wait forever
+        tokens = min(tokens, self.tpm)
+        requests = min(requests, self.rpm)
+        deadline = None if max_wait is None else time.time() + max_wait
+
+        with self._cond:
+            ticket = next(self._tickets)
+            self._queue.append(ticket)
+            try:
+                while True:
+                    remaining = None if deadline is None else deadline - time.time()
+                    if self._queue[0] != ticket:
+                        # Not our turn yet; the head of the queue notifies when it leaves
+                        if remaining is not None and remaining <= 0:
+                            raise Throttled(self._estimate_queue_wait(ticket))
+                        self._cond.wait(remaining)
+                        continue
+
+                    wait = self._take(requests, tokens)
+                    if wait == 0:
+                        return
+                    if remaining is not None and wait > remaining:
+                        raise Throttled(wait)
+                    self._cond.wait(wait)
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+
+    def snapshot(self):
+        """Current utilization for dashboards: how much of each bucket is spent."""
+        with self._cond:
+            with self._shared_state() as state:
+                self._refill(state, time.time())
+                return {
+                    "rpm": self.rpm,
+                    "tpm": self.tpm,
+                    "requests_used": self.rpm - state["requests"],
+                    "tokens_used": self.tpm - state["tokens"],
+                    "waiting": len(self._queue),
+                }
+
+    def _estimate_queue_wait(self, ticket):
+        ahead = self._queue.index(ticket)
+        return max(1.0, ahead * 60.0 / self.rpm)
+
+    def _take(self, requests, tokens):
+        """Takes from both buckets. Returns 0, or the seconds until enough refills."""
+        with self._shared_state() as state:
+            self._refill(state, time.time())
+            if state["requests"] >= requests and state["tokens"] >= tokens:
+                state["requests"] -= requests
+                state["tokens"] -= tokens
+                return 0.0
+            wait_requests = max(0.0, requests - state["requests"]) * 60.0 / self.rpm
+            wait_tokens = max(0.0, tokens - state["tokens"]) * 60.0 / self.tpm
+            return max(wait_requests, wait_tokens, 0.01)
+
+    def _refill(self, state, now):
+        elapsed = max(0.0, now - state["updated"])
+        state["requests"] = min(self.rpm, state["requests"] + elapsed * self.rpm / 60.0)
+        state["tokens"] = min(self.tpm, state["tokens"] + elapsed * self.tpm / 60.0)
+        state["updated"] = now
+
+    @contextmanager
+    def _shared_state(self):
+        if self.state_file is None:
+            yield self._state
+            return
+
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        with open(self.state_file, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read())
+                except ValueError:
+                    state = dict(self._state)
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(kind="chat"):
+    """Returns the process-wide limiter for "chat" or "embed" calls."""
+    with _limiters_lock:
+        if kind not in _limiters:
+            rpm, tpm = LIMITS[kind]
+            state_file = os.path.join(STATE_DIR, f"{kind}.json") if STATE_DIR else None
+            _limiters[kind] = TokenBucketLimiter(rpm, tpm, state_file=state_file)
+        return _limiters[kind]
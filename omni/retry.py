@@ -0,0 +1,120 @@
+"""
+Shared rate-limit backoff.
+
+When Gemini answers 429, every session in the process should slow down, not
+just the one that got unlucky. RetryScheduler keeps a single cooldown
+deadline for the whole process; while it is active omni.llm refuses to call
+the API (raising CoolingDown) so sessions queue behind it instead of hammering
+the quota.
+
+Nothing here sleeps. Callers get a delay back and decide how to wait — the
+Streamlit apps reschedule the action with a countdown fragment, background
+workers can simply sleep in their own thread.
+"""
+import random
+import re
+import threading
+import time
+
+from google.api_core.exceptions import ResourceExhausted
+
+BASE_DELAY = 2.0   # seconds before the first retry
+MAX_DELAY = 60.0   # never wait longer than this between attempts
+
+
+class CoolingDown(ResourceExhausted):
+    """Raised instead of calling the API while the shared cooldown is active."""
+
+    def __init__(self, remaining):
+        super().__init__(f"Shared rate-limit cooldown active ({remaining:.1f}s left)")
+        self.remaining = remaining
+
+
+def retry_after_hint(error):
+    """Returns the server's suggested wait in seconds, or None if it gave none."""
+    if error is None:
+        return None
+    if isinstance(error, CoolingDown):
+        return error.remaining
+
+    # 1. google.rpc.RetryInfo attached to the gRPC error
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+
+    # 2. Retry-After header on REST responses
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    if headers.get("retry-after"):
+        try:
+            return float(headers["retry-after"])
+        except ValueError:
+            pass
+
+    # 3. "Please retry in 12.3s" / "retryDelay": "37s" in the message
+    match = re.search(r"retry(?:[ _]?delay)?\W+(?:in\W+)?(\d+(?:\.\d+)?)\s*s",
+                      str(error), re.IGNORECASE)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class RetryScheduler:
+    def __init__(self, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._cooldown_until = 0.0
+        self._lock = threading.Lock()
+
+    def cooldown_remaining(self):
+        return max(0.0, self._cooldown_until - time.time())
+
+    def check(self):
+        """Raises CoolingDown if another caller recently hit the rate limit."""
+        remaining = self.cooldown_remaining()
+        if remaining > 0:
+            raise CoolingDown(remaining)
+
+    def record(self, error):
+        """Starts (or extends) the shared cooldown after a 429."""
+        wait = retry_after_hint(error) or self.base_delay
+        self._extend(wait)
+
+    def delay_for(self, attempt, error=None):
+        """Seconds to wait before retry number `attempt` (0-based).
+
+        Full-jitter exponential backoff, but never sooner than the server's
+        hint or the shared cooldown. The chosen delay also extends the shared
+        cooldown so other sessions back off together.
+
+        CoolingDown errors (Throttled included) were raised before any API
+        call, so they are no new evidence of a 429: they get the wait they
+        name plus jitter and leave the shared cooldown alone.
+        """
+        if isinstance(error, CoolingDown):
+            return error.remaining + random.uniform(0, self.base_delay)
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        delay = random.uniform(self.base_delay, max(self.base_delay, ceiling))
+        delay = max(delay, retry_after_hint(error) or 0.0, self.cooldown_remaining())
+        self._extend(delay)
+        return delay
+
+    def _extend(self, seconds):
+        with self._lock:
+            self._cooldown_until = max(self._cooldown_until, time.time() + seconds)
+
+
+_scheduler = RetryScheduler()
+
+
+def get_retry_scheduler():
+    """Returns the process-wide scheduler."""
+    return _scheduler
+
+
+def rate_limit_message(error):
+    """What to tell the user after a ResourceExhausted, with a retry time."""
+    wait = retry_after_hint(error) or _scheduler.cooldown_remaining() or BASE_DELAY
+    return (f"⚠️ **High traffic:** the AI quota is used up for the moment. "
+            f"Please try again in {int(wait) + 1} seconds.")
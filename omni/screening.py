@@ -0,0 +1,229 @@
+"""
+Batch gap analysis: rank N resumes against M job descriptions.
+
+A full LLM audit per pair does not scale to a requisition with hundreds of
+applicants, so screening runs in two passes:
+
+1. Pre-score every pair locally as two N x M matrices: cosine similarity of
+   the document embeddings (cached, one batched call), and keyword coverage
+   (IDF-weighted share of the JD's key terms found in the resume, computed
+   as one matrix product).
+2. Send only the top `top_n` resumes per JD to Gemini for the full Gap
+   Analysis audit, concurrently under the shared rate limiter, and parse the
+   Human Score / Match Score out of each report.
+
+The result is one ranked table (pandas) for CSV / Parquet export.
+"""
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from google.api_core.exceptions import ResourceExhausted
+
+from omni.bm25 import tokenize
+from omni.llm import generate_with_backoff, get_embeddings
+from omni.metrics import bind
+from omni.profile import cached_profile
+from omni.stench import analyze, format_facts
+
+KEYWORDS_PER_JD = 40
+SIMILARITY_WEIGHT = 0.5  # the rest goes to keyword coverage
+MAX_WORKERS = 4
+# Words every JD uses; they say nothing about fit
+GENERIC_TERMS = frozenset(
+    "experience years year work working team teams ability strong skills skill including "
+    "role responsibilities requirements required preferred plus join our we you your "
+    "candidate candidates position job company excellent knowledge understanding using "
+    "need needs looking must should who what about across within new".split())
+
+
+def gap_analysis_prompt(resume_text, jd_text, facts=None):
+    """The Gap Analysis audit prompt (single analysis and batch screening).
+
+    facts: omni.stench findings for the resume. When given, the model is
+    told not to re-scan for buzzwords and only to judge them in context.
+    """
+    if facts:
+        authenticity = f"""AUTHENTICITY FACTS (precomputed locally, already verified; do not re-scan the resume for buzzwords):
+                {facts.replace(chr(10), chr(10) + " " * 16)}
+"""
+        red_flags = ("Judge the flagged phrases above in context in one or two lines; "
+                     "add only issues a word list can't catch (vague claims, missing specifics).")
+    else:
+        authenticity = ""
+        red_flags = ('List specific words/phrases that sound robotic (e.g., "delved", "tapestry", '
+                     '"unlocked", "spearheaded", "orchestrated"). If it sounds authentic, praise '
+                     'the specific human details.')
+    return f"""
+                Act as a ruthless Executive Recruiter and AI Detector.
+
+                TASK:
+                1. Compare the Resume against the JD.
+                2. Analyze the Resume for "AI Stench" (patterns that scream ChatGPT-written).
+
+                RESUME:
+                {resume_text}
+
+                JD:
+                {jd_text}
+
+                {authenticity}
+                OUTPUT FORMAT (Markdown):
+
+                ### 1. 🤖 Authenticity Check (THE MOST IMPORTANT SECTION)
+                * **Human Score:** (0-100% - Be brutal. 100% = Purely Human, 0% = Copy/Pasted from ChatGPT).
+                * **Verdict:** (e.g., "Authentic Professional", "Hybrid", or "Lazy AI Gen").
+                * **Red Flags:** {red_flags}
+
+                ### 2. 🎯 Match Score
+                * **Score:** (0-100%)
+                * **Summary:** One brutal sentence on if they get the interview.
+
+                ### 3. ⚠️ Critical Gaps
+                * (Bullet points of missing skills required by the JD)
+
+                ### 4. 💡 Strategic Advice
+                * (How to fix the gaps and remove the AI-sounding fluff)
+                """
+
+
+def parse_scores(report):
+    """(human score, match score) as ints from an audit report; None where missing.
+
+    Labels are anchored at the start of a line (after bullets / bold markers),
+    so an echoed "* Local Human Score: 40%" fact is not read as the model's.
+    """
+    human = re.search(r"^\W*Human Score:\**\s*(\d{1,3})", report, re.MULTILINE)
+    match = re.search(r"Match Score.*?^\W*Score:\**\s*(\d{1,3})", report,
+                      re.MULTILINE | re.DOTALL)
+    return (int(human.group(1)) if human else None,
+            int(match.group(1)) if match else None)
+
+
+def jd_keywords(jd_text, limit=KEYWORDS_PER_JD):
+    """The JD's key terms: its extracted skills if profiled before, else its most repeated terms."""
+    profile = cached_profile(jd_text, "jd")
+    if profile:
+        skills = (profile.get("required_skills") or []) + (profile.get("preferred_skills") or [])
+        terms = [t for skill in skills for t in tokenize(skill)
+                 if t not in GENERIC_TERMS and len(t) > 2]
+        if terms:
+            return list(dict.fromkeys(terms))[:limit]
+    counts = Counter(t for t in tokenize(jd_text) if t not in GENERIC_TERMS and len(t) > 2)
+    return [term for term, _ in counts.most_common(limit)]
+
+
+def prescore(resumes, jds, embeddings):
+    """Local N x M pre-scores for resumes and jds (name -> text dicts).
+
+    Returns a dict of matrices ("similarity", "coverage", "score") plus the
+    JD keyword lists and the vocabulary needed to explain misses.
+    """
+    resume_texts, jd_texts = list(resumes.values()), list(jds.values())
+
+    # 1. Embedding similarity: one batched (cached) call for every document
+    vectors = np.asarray(embeddings.embed_documents(resume_texts + jd_texts), dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = vectors[:len(resume_texts)] @ vectors[len(resume_texts):].T
+
+    # 2. Keyword coverage: presence matrix x IDF-weighted JD term matrix
+    keywords = [jd_keywords(text) for text in jd_texts]
+    vocabulary = {term: i for i, term in enumerate(dict.fromkeys(t for ks in keywords for t in ks))}
+    present = np.zeros((len(resume_texts), len(vocabulary)), dtype=np.float32)
+    for row, text in enumerate(resume_texts):
+        columns = [vocabulary[t] for t in set(tokenize(text)) if t in vocabulary]
+        present[row, columns] = 1.0
+    document_frequency = present.sum(axis=0)
+    idf = np.log(1 + len(resume_texts) / (1 + document_frequency))
+    wanted = np.zeros((len(jd_texts), len(vocabulary)), dtype=np.float32)
+    for row, terms in enumerate(keywords):
+        columns = [vocabulary[t] for t in terms]
+        wanted[row, columns] = idf[columns]
+    coverage = (present @ wanted.T) / np.maximum(wanted.sum(axis=1), 1e-12)
+
+    score = SIMILARITY_WEIGHT * similarity + (1 - SIMILARITY_WEIGHT) * coverage
+    return {"similarity": similarity, "coverage": coverage, "score": score,
+            "keywords": keywords, "vocabulary": vocabulary, "present": present, "idf": idf}
+
+
+def _missing(scores, resume_row, jd_row, limit=8):
+    vocabulary, present, idf = scores["vocabulary"], scores["present"], scores["idf"]
+    missing = [t for t in scores["keywords"][jd_row] if not present[resume_row, vocabulary[t]]]
+    return sorted(missing, key=lambda t: -idf[vocabulary[t]])[:limit]
+
+
+def screen(api_key, resumes, jds, top_n=3, max_workers=MAX_WORKERS, on_progress=None,
+           prompt_builder=gap_analysis_prompt):
+    """Ranks every resume against every JD; LLM-audits the top_n per JD.
+
+    resumes / jds: name -> text. Returns a DataFrame sorted by JD and rank.
+    on_progress(message) runs on the caller's thread. top_n=0 skips the LLM
+    entirely (local pre-score and AI-stench check only).
+    """
+    report = on_progress or (lambda message: None)
+    resume_names, jd_names = list(resumes), list(jds)
+    stench = {name: analyze(text) for name, text in resumes.items()}
+
+    report(f"Pre-scoring {len(resumes)} x {len(jds)} pairs locally...")
+    scores = prescore(resumes, jds, get_embeddings(api_key))
+    order = np.argsort(-scores["score"], axis=0)  # per JD column, best resume first
+
+    rows = []
+    for j, jd_name in enumerate(jd_names):
+        for rank, i in enumerate(order[:, j], start=1):
+            rows.append({
+                "jd": jd_name,
+                "resume": resume_names[i],
+                "rank": rank,
+                "prescore": round(float(scores["score"][i, j]), 4),
+                "similarity": round(float(scores["similarity"][i, j]), 4),
+                "keyword_coverage": round(float(scores["coverage"][i, j]), 4),
+                "missing_keywords": ", ".join(_missing(scores, i, j)),
+                "local_human_score": stench[resume_names[i]]["human_score"],
+                "red_flags": ", ".join(stench[resume_names[i]]["hits"]),
+                "human_score": np.nan,
+                "match_score": np.nan,
+                "audit": "",
+            })
+    table = pd.DataFrame(rows)
+
+    # Full audits for the shortlist only, a few at a time
+    shortlist = table.index[table["rank"] <= top_n]
+    if len(shortlist):
+        report(f"Auditing {len(shortlist)} shortlisted pairs with Gemini...")
+    audit = bind(generate_with_backoff)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(audit, api_key,
+                        prompt_builder(resumes[table.at[k, "resume"]], jds[table.at[k, "jd"]],
+                                       format_facts(stench[table.at[k, "resume"]]))): k
+            for k in shortlist
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            k = futures[future]
+            try:
+                text = future.result()
+                table.at[k, "human_score"], table.at[k, "match_score"] = parse_scores(text)
+            except ResourceExhausted:
+                text = "Skipped: API quota exhausted, rerun to audit (finished pairs are cached)"
+            except Exception as e:
+                text = f"Error: {e}"
+            table.at[k, "audit"] = text
+            report(f"Audited {done}/{len(shortlist)} shortlisted pairs...")
+
+    # Audited pairs are re-ranked by the LLM match score, the rest stay in pre-score order
+    table["_audited"] = table["match_score"].notna()
+    table = table.sort_values(["jd", "_audited", "match_score", "prescore"],
+                              ascending=[True, False, False, False])
+    table["rank"] = table.groupby("jd").cumcount() + 1
+    return table.drop(columns="_audited").reset_index(drop=True)
+
+
+def save_table(table, path):
+    """Writes CSV, or Parquet for a .parquet path (needs pyarrow or fastparquet)."""
+    if path.endswith(".parquet"):
+        table.to_parquet(path, index=False)
+    else:
+        table.to_csv(path, index=False)
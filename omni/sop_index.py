@@ -0,0 +1,448 @@
+"""
+Named, persisted SOP knowledge bases.
+
+Every collection lives on disk under ./chroma_db (the same place
+experiments/build_db.py writes to), so an indexed corpus survives restarts
+and is embedded once, not once per browser session. Open collections are
+cached for the life of the process and shared read-only by all sessions.
+
+Collections are NumPy stores (omni.vectorstore) by default: an mmap to open
+and one matrix product per query. A collection that only exists in an older
+ChromaDB build (chroma.sqlite3 in the same directory) is copied into a NumPy
+store the first time it is opened, vectors included, so nothing is
+re-embedded; that needs chromadb installed once. Set
+OMNI_VECTOR_BACKEND=chroma to keep using ChromaDB instead,
+OMNI_VECTOR_QUANTIZE=1 for int8 vectors, and OMNI_VECTOR_INDEX=ivfpq (with
+OMNI_ANN_NPROBE / OMNI_ANN_RERANK) for approximate search on very large
+corpora.
+
+Re-indexing is incremental. A manifest next to the collection
+(<name>.manifest.json) records a SHA-256 per source file and a content hash
+per chunk, so only new or changed chunks are embedded and chunks of removed
+files are deleted.
+
+Each collection also keeps a BM25 keyword index (<name>.bm25.npz, see
+omni.bm25), updated in the same incremental pass. search() fuses keyword and
+vector rankings with reciprocal rank fusion; OMNI_HYBRID_SEARCH=0 turns that
+off.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+from collections import Counter
+
+from langchain_core.documents import Document
+
+from omni.bm25 import BM25Index, reciprocal_rank_fusion
+from omni.ingest import load_pdfs_parallel
+from omni.llm import get_embeddings
+from omni.query_cache import get_query_cache
+from omni.tracing import span
+from omni.vectorstore import NumpyVectorStore
+
+PERSIST_DIR = "./chroma_db"
+BACKEND = os.getenv("OMNI_VECTOR_BACKEND", "numpy")
+QUANTIZE = os.getenv("OMNI_VECTOR_QUANTIZE", "0") == "1"
+VECTOR_INDEX = os.getenv("OMNI_VECTOR_INDEX", "exact")
+ANN_NPROBE = int(os.getenv("OMNI_ANN_NPROBE", "8"))
+ANN_RERANK = int(os.getenv("OMNI_ANN_RERANK", "16"))
+NUMPY_SUFFIX = ".npvec"
+HYBRID = os.getenv("OMNI_HYBRID_SEARCH", "1") == "1"
+CANDIDATES = 4  # each retriever proposes k * CANDIDATES chunks for fusion
+MIGRATE_BATCH = 5000  # rows read from a legacy Chroma collection at a time
+
+_clients = {}
+_collections = {}  # (persist_dir, name, api_key) -> vector store
+_keyword_indexes = {}  # (persist_dir, name) -> (index version, BM25Index or None)
+_lock = threading.Lock()
+_write_locks = {}  # one writer per collection at a time
+_migrate_lock = threading.Lock()
+
+
+def collection_name(label):
+    """Turns a user-typed label into a valid Chroma collection name."""
+    # Chroma wants 3-63 chars of [a-zA-Z0-9._-], starting and ending alphanumeric
+    name = re.sub(r"[^a-z0-9._-]+", "-", label.strip().lower()).strip("._-")
+    return (name or "sop").ljust(3, "0")[:63]
+
+
+def _import_chromadb():
+    # ChromaDB needs a newer SQLite than Streamlit Cloud ships; pysqlite3-binary
+    # stands in when installed. Only the Chroma backend pays for this.
+    try:
+        __import__('pysqlite3')
+        sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+    except ImportError:
+        pass
+    import chromadb
+    return chromadb
+
+
+def _client(persist_dir):
+    # One PersistentClient per directory, shared by every collection handle
+    with _lock:
+        if persist_dir not in _clients:
+            _clients[persist_dir] = _import_chromadb().PersistentClient(path=persist_dir)
+        return _clients[persist_dir]
+
+
+def _legacy_client(persist_dir):
+    """The Chroma client for a build made before the NumPy backend, or None."""
+    if not os.path.exists(os.path.join(persist_dir, "chroma.sqlite3")):
+        return None
+    try:
+        return _client(persist_dir)
+    except ImportError:
+        return None  # chromadb is gone: the old build can't be read
+
+
+def list_collections(persist_dir=PERSIST_DIR):
+    """Names of the knowledge bases on disk, sorted."""
+    if BACKEND == "numpy":
+        if not os.path.isdir(persist_dir):
+            return []
+        names = {entry[:-len(NUMPY_SUFFIX)] for entry in os.listdir(persist_dir)
+                 if entry.endswith(NUMPY_SUFFIX)}
+        legacy = _legacy_client(persist_dir)
+        if legacy is not None:
+            # Still on Chroma; open_collection() migrates them
+            names.update(getattr(c, "name", c) for c in legacy.list_collections())
+        return sorted(names)
+    # Newer chromadb returns names, older versions return Collection objects
+    return sorted(getattr(c, "name", c) for c in _client(persist_dir).list_collections())
+
+
+def _migrate_from_chroma(db, name, persist_dir):
+    """Copies a legacy Chroma collection (ids, vectors, texts, metadata) into `db`."""
+    legacy = _legacy_client(persist_dir)
+    if legacy is None:
+        return
+    try:
+        collection = legacy.get_collection(name)
+    except Exception:
+        return  # not in the old build (chromadb's error type varies by version)
+    offset = 0
+    with span("index.migrate", collection=name):
+        while True:
+            batch = collection.get(include=["embeddings", "documents", "metadatas"],
+                                   limit=MIGRATE_BATCH, offset=offset)
+            if not len(batch["ids"]):
+                break
+            db.upsert_vectors(batch["ids"], batch["embeddings"], batch["documents"],
+                              [metadata or {} for metadata in batch["metadatas"]])
+            offset += len(batch["ids"])
+
+
+def open_collection(name, api_key, persist_dir=PERSIST_DIR, migrate=True):
+    """Returns the shared handle for a collection, loading it on first use.
+
+    With the NumPy backend, a collection found only in a legacy Chroma build
+    is migrated on first use unless migrate=False.
+    """
+    key = (persist_dir, name, api_key)
+    with _lock:
+        db = _collections.get(key)
+    if db is not None:
+        return db
+
+    if BACKEND == "numpy":
+        directory = os.path.join(persist_dir, name + NUMPY_SUFFIX)
+        db = NumpyVectorStore(get_embeddings(api_key), quantize=QUANTIZE, directory=directory,
+                              index=VECTOR_INDEX, nprobe=ANN_NPROBE, rerank=ANN_RERANK)
+        if migrate and not os.path.isdir(directory):
+            with _migrate_lock:
+                if not os.path.isdir(directory):
+                    _migrate_from_chroma(db, name, persist_dir)
+    else:
+        from langchain_community.vectorstores import Chroma
+        db = Chroma(client=_client(persist_dir), collection_name=name,
+                    embedding_function=get_embeddings(api_key))
+    with _lock:
+        return _collections.setdefault(key, db)
+
+
+def open_for_build(name, api_key, persist_dir=PERSIST_DIR, resume=False):
+    """(collection, manifest) for a full rebuild that writes its own manifest.
+
+    Without a manifest nothing in the collection can be matched to a source
+    (a legacy Chroma build keeps LangChain's uuid ids), so it is dropped and
+    opened empty instead of migrated. resume=True keeps the rows of an
+    interrupted rebuild, which already use content-hash ids.
+    """
+    manifest = load_manifest(name, persist_dir)
+    if manifest is None and not resume and name in list_collections(persist_dir):
+        drop_collection(name, persist_dir)
+    db = open_collection(name, api_key, persist_dir, migrate=manifest is not None)
+    return db, manifest or {"version": 0, "files": {}}
+
+
+def store_vectors(db, ids, vectors, texts, metadatas):
+    """Upserts precomputed vectors into either backend."""
+    if isinstance(db, NumpyVectorStore):
+        db.upsert_vectors(ids, vectors, texts, metadatas)
+    else:
+        db._collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+
+
+def existing_ids(db, ids):
+    """The subset of `ids` already stored in the collection."""
+    if isinstance(db, NumpyVectorStore):
+        return db.existing_ids(ids)
+    return db._collection.get(ids=list(ids), include=[])["ids"]
+
+
+def _vector_hits(db, vector, k):
+    """[(chunk id, Document)] nearest to `vector`, best first."""
+    if isinstance(db, NumpyVectorStore):
+        return [(chunk_id, doc) for chunk_id, doc, _ in db.search_by_vector(vector, k)]
+    result = db._collection.query(query_embeddings=[vector], n_results=k,
+                                  include=["documents", "metadatas"])
+    return [(chunk_id, Document(page_content=text, metadata=metadata or {}))
+            for chunk_id, text, metadata in
+            zip(result["ids"][0], result["documents"][0], result["metadatas"][0])]
+
+
+def _documents(db, ids=None):
+    """[(chunk id, Document)] for the given ids, or the whole collection."""
+    if isinstance(db, NumpyVectorStore):
+        return db.get_documents(ids)
+    result = db.get(ids=ids, include=["documents", "metadatas"])
+    return [(chunk_id, Document(page_content=text, metadata=metadata or {}))
+            for chunk_id, text, metadata in
+            zip(result["ids"], result["documents"], result["metadatas"])]
+
+
+def update_metadata(db, ids, metadatas):
+    """Replaces the metadata of stored chunks in either backend; vectors are kept."""
+    if isinstance(db, NumpyVectorStore):
+        db.update_metadata(ids, metadatas)
+    else:
+        db._collection.update(ids=ids, metadatas=metadatas)
+
+
+def drop_collection(name, persist_dir=PERSIST_DIR):
+    """Deletes a collection and its keyword index (the manifest is left alone)."""
+    if os.path.exists(keyword_index_path(name, persist_dir)):
+        os.remove(keyword_index_path(name, persist_dir))
+    if BACKEND == "numpy":
+        shutil.rmtree(os.path.join(persist_dir, name + NUMPY_SUFFIX), ignore_errors=True)
+    else:
+        _client(persist_dir).delete_collection(name)
+    _forget(persist_dir, name)
+
+
+def manifest_path(name, persist_dir=PERSIST_DIR):
+    return os.path.join(persist_dir, f"{name}.manifest.json")
+
+
+def index_version(name, persist_dir=PERSIST_DIR):
+    """Cheap change marker for a collection: the manifest's mtime (one stat call)."""
+    try:
+        return os.stat(manifest_path(name, persist_dir)).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def keyword_index_path(name, persist_dir=PERSIST_DIR):
+    return os.path.join(persist_dir, f"{name}.bm25.npz")
+
+
+def load_keyword_index(name, persist_dir=PERSIST_DIR, db=None):
+    """The collection's BM25 index for updating; rebuilt from `db` if it has none yet."""
+    path = keyword_index_path(name, persist_dir)
+    if os.path.exists(path):
+        return BM25Index.load(path)
+    index = BM25Index()
+    if db is not None:
+        # Collections indexed before keyword search existed
+        pairs = _documents(db)
+        index.add([chunk_id for chunk_id, _ in pairs], [doc.page_content for _, doc in pairs])
+    return index
+
+
+def save_keyword_index(name, index, persist_dir=PERSIST_DIR):
+    index.save(keyword_index_path(name, persist_dir))
+
+
+def keyword_index(name, persist_dir=PERSIST_DIR, version=None):
+    """Shared read-only BM25 index, reloaded when the collection changes (None if absent)."""
+    if version is None:
+        version = index_version(name, persist_dir)
+    key = (persist_dir, name)
+    with _lock:
+        cached = _keyword_indexes.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+    path = keyword_index_path(name, persist_dir)
+    index = BM25Index.load(path) if os.path.exists(path) else None
+    with _lock:
+        _keyword_indexes[key] = (version, index)
+    return index
+
+
+def search(name, api_key, query, k=3, persist_dir=PERSIST_DIR, hybrid=HYBRID):
+    """Top-k chunks for a query, with repeat questions served from the query cache.
+
+    With hybrid, BM25 and vector rankings are fused (reciprocal rank fusion).
+    """
+    with span("retrieve", collection=name, k=k):
+        db = open_collection(name, api_key, persist_dir)
+        version = index_version(name, persist_dir)
+        keywords = keyword_index(name, persist_dir, version) if hybrid else None
+
+        def hybrid_retrieve(normalized, vector, k):
+            depth = k * CANDIDATES
+            with span("retrieve.vector", k=depth):
+                dense = _vector_hits(db, vector, depth)
+            with span("retrieve.keywords", k=depth):
+                sparse = [chunk_id for chunk_id, _ in keywords.search(normalized, depth)]
+            fused = reciprocal_rank_fusion([[chunk_id for chunk_id, _ in dense], sparse])[:k]
+            docs = dict(dense)
+            docs.update(_documents(db, [chunk_id for chunk_id in fused if chunk_id not in docs]))
+            return [docs[chunk_id] for chunk_id in fused if chunk_id in docs]
+
+        return get_query_cache().search(db, db.embeddings, (persist_dir, name), version,
+                                        query, k=k,
+                                        retrieve=hybrid_retrieve if keywords else None)
+
+
+def load_manifest(name, persist_dir=PERSIST_DIR):
+    """{"version": int, "files": {source: {"sha256": str, "chunks": [ids]}}} or None."""
+    try:
+        with open(manifest_path(name, persist_dir)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_manifest(name, manifest, persist_dir=PERSIST_DIR):
+    # Write then rename, so readers never see a half-written file
+    path = manifest_path(name, persist_dir)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+
+def chunk_ids(source, chunks):
+    """Stable ids from chunk content: unchanged text keeps its id (and its vector)."""
+    seen = Counter()
+    ids = []
+    for chunk in chunks:
+        digest = hashlib.sha256(f"{source}\x00{chunk.page_content}".encode("utf-8")).hexdigest()[:32]
+        # Identical boilerplate chunks inside one file still need distinct ids
+        ids.append(f"{digest}-{seen[digest]}")
+        seen[digest] += 1
+    return ids
+
+
+def upsert_sources(name, files, splitter, api_key, remove_missing=True,
+                   persist_dir=PERSIST_DIR, on_progress=None):
+    """Brings a collection in line with the given files, embedding only what changed.
+
+    files: (source name, pdf bytes) pairs. With remove_missing, sources in the
+    collection that aren't in `files` are deleted. A changed file that fails
+    to parse keeps its old chunks and hash, so the next run tries it again.
+    Returns a dict of counts.
+    """
+    with _lock:
+        write_lock = _write_locks.setdefault((persist_dir, name), threading.Lock())
+
+    with write_lock:
+        manifest = load_manifest(name, persist_dir)
+        # No manifest means we can't trust what's in there: start clean
+        fresh = manifest is None
+        if fresh:
+            if name in list_collections(persist_dir):
+                drop_collection(name, persist_dir)
+            manifest = {"version": 0, "files": {}}
+        known = manifest["files"]
+
+        # 1. Which files changed? One hash each, no parsing for unchanged files
+        with span("ingest.hash", files=len(files)):
+            hashes = {source: hashlib.sha256(data).hexdigest() for source, data in files}
+        changed = [(source, data) for source, data in files
+                   if known.get(source, {}).get("sha256") != hashes[source]]
+        removed = [source for source in known if remove_missing and source not in hashes]
+
+        # 2. Parse and split only the changed files
+        failed = set()
+
+        def parsed(source, num_pages, error):
+            if error is not None:
+                failed.add(source)
+            if on_progress:
+                on_progress(source, num_pages, error)
+
+        with span("ingest.parse", files=len(changed)):
+            pages = load_pdfs_parallel(changed, on_progress=parsed) if changed else []
+        with span("ingest.split", pages=len(pages)):
+            all_chunks = splitter.split_documents(pages)
+        chunks_by_source = {}
+        for chunk in all_chunks:
+            chunks_by_source.setdefault(chunk.metadata["source"], []).append(chunk)
+
+        to_add, add_ids, to_delete = [], [], []
+        keep_ids, keep_metadata = [], []
+        for source, _ in changed:
+            if source in failed:
+                continue  # unreadable this time: leave the indexed version alone
+            chunks = chunks_by_source.get(source, [])
+            ids = chunk_ids(source, chunks)
+            old_ids = set(known.get(source, {}).get("chunks", []))
+            for chunk_id, chunk in zip(ids, chunks):
+                if chunk_id in old_ids:
+                    # Same text, maybe a new page number: metadata only, no embedding
+                    keep_ids.append(chunk_id)
+                    keep_metadata.append(chunk.metadata)
+                else:
+                    to_add.append(chunk)
+                    add_ids.append(chunk_id)
+            to_delete.extend(old_ids - set(ids))
+            known[source] = {"sha256": hashes[source], "chunks": ids}
+        for source in removed:
+            to_delete.extend(known.pop(source)["chunks"])
+
+        # 3. Apply the diff
+        # (embedding happens inside add_documents, as a nested "embed" span)
+        with span("index.write", added=len(to_add), deleted=len(to_delete)):
+            db = open_collection(name, api_key, persist_dir, migrate=not fresh)
+            if to_delete:
+                db.delete(ids=to_delete)
+            if keep_ids:
+                update_metadata(db, keep_ids, keep_metadata)
+            if to_add:
+                db.add_documents(to_add, ids=add_ids)
+
+        # 4. Same diff for the keyword index (no API calls, just tokenizing)
+        if to_delete or to_add or not os.path.exists(keyword_index_path(name, persist_dir)):
+            with span("index.keywords", added=len(to_add)):
+                keywords = load_keyword_index(name, persist_dir, db)
+                keywords.remove(to_delete)
+                keywords.add(add_ids, [chunk.page_content for chunk in to_add])
+                save_keyword_index(name, keywords, persist_dir)
+
+        if len(changed) > len(failed) or removed:
+            manifest["version"] += 1
+        save_manifest(name, manifest, persist_dir)
+
+        return {
+            "files_changed": len(changed) - len(failed),
+            "files_unchanged": len(files) - len(changed),
+            "files_failed": len(failed),
+            "files_removed": len(removed),
+            "chunks_added": len(to_add),
+            "chunks_deleted": len(to_delete),
+            "chunks_total": sum(len(f["chunks"]) for f in known.values()),
+        }
+
+
+def _forget(persist_dir, name):
+    # Drop cached handles so every session picks up the new collection
+    with _lock:
+        for key in [k for k in _collections if k[:2] == (persist_dir, name)]:
+            del _collections[key]
+    get_query_cache().invalidate((persist_dir, name))
@@ -0,0 +1,114 @@
+"""
+Local "AI Stench" detector for resumes: no API call, deterministic.
+
+Two cheap signals:
+
+* Phrase hits: one compiled regex over PHRASES. The alternation is built
+  from a character trie, so shared prefixes ("orchestrat-", "spearhead-")
+  are matched once and the regex engine never backtracks through hundreds
+  of separate alternatives.
+* Stylometry: generated text is smooth. Sentence lengths vary little
+  (low coefficient of variation), and buzzwords are dense.
+
+The result feeds the Gap Analysis prompt as precomputed facts (so the
+model doesn't re-scan for buzzwords) and gives batch screening a local
+human score without any LLM call. The score is a heuristic, not a
+classifier; treat it as a flag for review.
+"""
+import re
+import statistics
+from collections import Counter
+
+# Lowercase, one entry per surface form; keep this list sorted by theme
+PHRASES = [
+    # The classics
+    "delve", "delved", "delves", "delving", "tapestry", "testament to", "realm",
+    "navigate the complexities", "ever-evolving", "in today's fast-paced",
+    # Inflated verbs
+    "spearheaded", "spearheading", "orchestrated", "orchestrating", "unlocked", "unlocking",
+    "leveraged", "leveraging", "harnessed", "harnessing", "elevated", "elevating",
+    "empowered", "empowering", "fostered", "fostering", "championed", "revolutionized",
+    "streamlined", "showcasing", "underscoring", "embarked",
+    # Filler adjectives
+    "pivotal", "meticulous", "meticulously", "seamless", "seamlessly", "robust",
+    "holistic", "multifaceted", "transformative", "cutting-edge", "best-in-class",
+    "game-changer", "game-changing", "innovative", "dynamic", "synergy", "synergies",
+    # Template phrases
+    "results-driven", "proven track record", "passionate about", "thought leader",
+    "fast-paced environment", "a deep understanding of", "dedicated to driving",
+    "with a strong focus on", "drive impactful", "impactful results",
+]
+BUZZWORD_DENSITY_FLAG = 1.5  # hits per 100 words
+SENTENCE_CV_FLAG = 0.35      # human writing usually varies more than this
+
+
+def _trie_pattern(phrases):
+    """Regex alternation shaped like a character trie over the phrases."""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}  # end of a phrase
+
+    def build(node):
+        ends = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if ends:
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+PATTERN = re.compile(r"\b" + _trie_pattern(PHRASES).replace(r"\ ", r"\s+") + r"\b", re.IGNORECASE)
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+\s*[-*•]?\s*")
+WORD = re.compile(r"[A-Za-z][A-Za-z'-]*")
+
+
+def analyze(text):
+    """Red-flag phrases and style statistics for a resume, plus a 0-100 human score."""
+    hits = Counter(" ".join(m.group(0).lower().split()) for m in PATTERN.finditer(text))
+    words = len(WORD.findall(text))
+    lengths = [n for n in (len(WORD.findall(s)) for s in SENTENCE_SPLIT.split(text)) if n >= 3]
+
+    mean = statistics.fmean(lengths) if lengths else 0.0
+    cv = statistics.pstdev(lengths) / mean if len(lengths) > 1 and mean else 0.0
+    density = 100.0 * sum(hits.values()) / words if words else 0.0
+
+    # Heuristic: buzzword density dominates, uniform sentence rhythm adds a penalty
+    score = 100 - min(60, density * 20) - (20 if lengths and cv < SENTENCE_CV_FLAG else 0)
+    score = max(0, min(100, round(score)))
+    if score >= 75:
+        verdict = "Authentic Professional"
+    elif score >= 45:
+        verdict = "Hybrid"
+    else:
+        verdict = "Lazy AI Gen"
+
+    return {
+        "hits": dict(hits.most_common()),
+        "words": words,
+        "sentences": len(lengths),
+        "sentence_length_mean": round(mean, 1),
+        "sentence_length_cv": round(cv, 2),
+        "buzzword_density": round(density, 2),
+        "human_score": score,
+        "verdict": verdict,
+    }
+
+
+def format_facts(report):
+    """The detector's findings as short prompt lines."""
+    flagged = ", ".join(f'"{p}" x{n}' for p, n in report["hits"].items()) or "none"
+    return "\n".join([
+        f"* Local Human Score: {report['human_score']}% ({report['verdict']})",
+        f"* Flagged phrases: {flagged}",
+        f"* Buzzword density: {report['buzzword_density']} per 100 words "
+        f"(flag above {BUZZWORD_DENSITY_FLAG})",
+        f"* Sentence length: mean {report['sentence_length_mean']} words, "
+        f"variation {report['sentence_length_cv']} (flag below {SENTENCE_CV_FLAG})",
+    ])
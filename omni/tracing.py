@@ -0,0 +1,246 @@
+"""
+Span tracer for the RAG pipeline stages (parse, split, embed, retrieve, generate).
+
+    with span("retrieve", k=8):
+        ...
+
+    @traced("ingest.split")
+    def split(...):
+        ...
+
+Spans are timed with perf_counter_ns and kept per thread, so nesting (a
+"retrieve" span holding the "embed" of the query) is rebuilt from the
+intervals afterwards instead of being tracked on every call. Results come
+out two ways:
+
+* breakdown() / print_breakdown(): a stage tree with calls, total and self
+  time, for the console or a Streamlit table
+* chrome_trace() / export(): Chrome trace event JSON, which opens in
+  chrome://tracing or https://ui.perfetto.dev
+
+Tracing is off unless OMNI_TRACE=1 (or enable() is called). When off,
+span() returns a shared no-op object and traced() functions pay one flag
+check, so the hooks can stay in hot paths.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+MAX_EVENTS = 100_000  # the process-wide tracer keeps only the most recent spans
+TRACE_FILE = os.getenv("OMNI_TRACE_FILE", "trace.json")
+
+_enabled = os.getenv("OMNI_TRACE", "0") == "1"
+
+
+def enable(on=True):
+    """Turns tracing on or off for the whole process."""
+    global _enabled
+    _enabled = bool(on)
+
+
+def is_enabled():
+    return _enabled
+
+
+class Tracer:
+    """A list of finished spans. Spans added here are also passed to `parent`."""
+
+    def __init__(self, parent=None, max_events=None):
+        self.parent = parent
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+
+    def add(self, event):
+        with self._lock:
+            self._events.append(event)
+        if self.parent is not None:
+            self.parent.add(event)
+
+    def events(self):
+        with self._lock:
+            return list(self._events)
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+    def chrome_trace(self):
+        """The spans as a Chrome trace event dict (complete "X" events, µs)."""
+        events = self.events()
+        threads = {(e["pid"], e["tid"]): e["thread"] for e in events}
+        trace = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                 for (pid, tid), name in threads.items()]
+        for e in events:
+            trace.append({"name": e["name"], "cat": e["name"].split(".")[0], "ph": "X",
+                          "ts": e["start"] / 1000, "dur": (e["end"] - e["start"]) / 1000,
+                          "pid": e["pid"], "tid": e["tid"], "args": e["args"]})
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def export(self, path=TRACE_FILE):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+    def breakdown(self):
+        """One row per stage path, parents before children.
+
+        Rows: stage (indented by depth), calls, total_ms, self_ms (total minus
+        child spans) and share of the traced wall time. Stages that ran in
+        parallel threads can add up to more than 100%.
+        """
+        stats = {}  # path -> [calls, total ns, child ns]
+        events = sorted(self.events(), key=lambda e: (e["pid"], e["tid"], e["start"], -e["end"]))
+        stack, thread = [], None
+        for e in events:
+            if (e["pid"], e["tid"]) != thread:
+                stack, thread = [], (e["pid"], e["tid"])
+            # The innermost open span that still contains this one is its parent
+            while stack and stack[-1][0] < e["end"]:
+                stack.pop()
+            path = (stack[-1][1] if stack else ()) + (e["name"],)
+            duration = e["end"] - e["start"]
+            row = stats.setdefault(path, [0, 0, 0])
+            row[0] += 1
+            row[1] += duration
+            if stack:
+                stats[stack[-1][1]][2] += duration
+            stack.append((e["end"], path))
+
+        first_seen = {path: i for i, path in enumerate(stats)}
+        wall = 1
+        if events:
+            wall = max(e["end"] for e in events) - min(e["start"] for e in events) or 1
+        rows = []
+        for path in sorted(stats, key=lambda p: [first_seen[p[:i + 1]] for i in range(len(p))]):
+            calls, total, child = stats[path]
+            rows.append({
+                "stage": "  " * (len(path) - 1) + path[-1],
+                "calls": calls,
+                "total_ms": round(total / 1e6, 1),
+                "self_ms": round(max(total - child, 0) / 1e6, 1),
+                "share": round(total / wall, 3),
+            })
+        return rows
+
+    def print_breakdown(self, title="Stage breakdown"):
+        rows = self.breakdown()
+        if not rows:
+            return
+        width = max(len(row["stage"]) for row in rows) + 2
+        print(f"   ⏱️ {title}")
+        print(f"      {'stage':<{width}}{'calls':>6}{'total ms':>11}{'self ms':>10}{'share':>7}")
+        for row in rows:
+            print(f"      {row['stage']:<{width}}{row['calls']:>6}{row['total_ms']:>11.1f}"
+                  f"{row['self_ms']:>10.1f}{row['share']:>7.0%}")
+
+
+_tracer = Tracer(max_events=MAX_EVENTS)
+_collector = contextvars.ContextVar("omni_trace_collector", default=_tracer)
+
+
+def get_tracer():
+    """The process-wide tracer (every span, from every thread)."""
+    return _tracer
+
+
+def report(path=TRACE_FILE, tracer=None):
+    """For CLI scripts: prints the stage breakdown and writes the Chrome trace.
+
+    Does nothing while tracing is off. Returns the trace path, or None.
+    """
+    if not _enabled:
+        return None
+    tracer = tracer or _tracer
+    tracer.print_breakdown()
+    tracer.export(path)
+    print(f"   📈 Chrome trace written to {path} (open in https://ui.perfetto.dev)")
+    return path
+
+
+@contextmanager
+def collect():
+    """Gathers the spans of one block (this thread) in their own Tracer.
+
+        with collect() as trace:
+            ...
+        trace.print_breakdown()
+
+    The spans still reach the enclosing collector, so the process-wide
+    tracer sees everything. Spans in worker threads only go to the
+    process-wide tracer.
+    """
+    tracer = Tracer(parent=_collector.get())
+    token = _collector.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _collector.reset(token)
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def set(self, **args):
+        """Attaches values (counts, sizes) to the span."""
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        thread = threading.current_thread()
+        _collector.get().add({"name": self.name, "start": self.start, "end": end,
+                              "pid": os.getpid(), "tid": thread.ident, "thread": thread.name,
+                              "args": self.args})
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name, **args):
+    """Context manager timing one stage; args are shown in the trace viewer."""
+    if not _enabled:
+        return _NOOP
+    return _Span(name, args)
+
+
+def traced(name=None):
+    """Decorator form of span(), named after the function unless `name` is given."""
+    def decorate(fn):
+        label = name or fn.__qualname__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(label, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,494 @@
+"""
+A small NumPy vector store: the Chroma surface the apps use, minus SQLite.
+
+Vectors are L2-normalized float32 rows (or int8 codes plus a per-row scale
+with quantize=True, ~4x smaller). Writes are append-only: an upsert adds a
+segment holding just the new rows, and deletes or replacements only record
+tombstones, so a write costs about the size of the batch, not the store:
+
+    <directory>/CURRENT          name of the live state file
+    <directory>/v000012.json     {"segments": [{"name": "s000011", "deleted": [rows]}, ...]}
+    <directory>/s000011/
+        vectors.npy              (N, D) float32 or int8, memory-mapped
+        scales.npy               (N,) float32, quantized stores only
+        docs.jsonl               one {"text", "metadata"} line per row
+        offsets.npy              (N + 1,) byte offsets into docs.jsonl
+        ids.json                 row -> id
+        ivf.npz                  IVF-PQ index, index="ivfpq" segments of MIN_ROWS+ rows
+
+Segments are merged like a binary counter: while the newest segment holds at
+least as many live rows as the one before it, the two are rewritten as one.
+That keeps O(log N) segments and rewrites each row O(log N) times over the
+life of the store. Once COMPACT_DELETED of the rows are tombstoned,
+everything is compacted into a single segment.
+
+A query is one matrix-vector product plus argpartition per segment; with
+index="ivfpq" large segments scan only the closest IVF cells (see omni.ann).
+Readers keep the state they loaded while a writer builds the next one, then
+pick it up on their next query. Stores written before segments existed (a
+CURRENT naming a gNNNNNN directory) open as a single segment.
+"""
+import json
+import os
+import shutil
+import threading
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+
+from omni.ann import MIN_ROWS, NPROBE, RERANK, IVFPQIndex
+
+QUANTIZED_BLOCK = 65536  # rows dequantized per step, bounds query memory
+COMPACT_DELETED = 0.2    # share of tombstoned rows that triggers a full compaction
+
+_NO_ROWS = np.zeros(0, dtype=np.int64)
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _quantize(vectors):
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales = np.maximum(scales, 1e-12).astype(np.float32)
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales
+
+
+def _record(text, metadata):
+    return (json.dumps({"text": text, "metadata": metadata or {}}) + "\n").encode("utf-8")
+
+
+class _Segment:
+    """An immutable run of rows: vectors, their JSON records and their ids."""
+
+    def __init__(self, name, vectors, scales, offsets, docs, ids, index=None):
+        self.name = name  # directory name, None until saved
+        self.vectors = vectors
+        self.scales = scales
+        self.offsets = offsets
+        self.docs = docs
+        self.ids = ids
+        self.index = index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def record(self, row):
+        start, stop = self.offsets[row], self.offsets[row + 1]
+        return bytes(self.docs[start:stop])
+
+    def dense(self, rows):
+        """float32 vectors of `rows`, dequantized."""
+        block = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            block = block * self.scales[rows][:, None]
+        return block
+
+    @classmethod
+    def build(cls, vectors, records, ids, quantize, index=None):
+        scales = None
+        if quantize:
+            vectors, scales = _quantize(vectors)
+        offsets = np.zeros(len(records) + 1, dtype=np.int64)
+        np.cumsum([len(r) for r in records], out=offsets[1:])
+        docs = np.frombuffer(b"".join(records), dtype=np.uint8)
+        return cls(None, vectors, scales, offsets, docs, list(ids), index)
+
+    def save(self, directory, name):
+        path = os.path.join(directory, name)
+        tmp = path + f".tmp-{uuid.uuid4().hex[:8]}"
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "vectors.npy"), self.vectors)
+        if self.scales is not None:
+            np.save(os.path.join(tmp, "scales.npy"), self.scales)
+        np.save(os.path.join(tmp, "offsets.npy"), self.offsets)
+        with open(os.path.join(tmp, "docs.jsonl"), "wb") as f:
+            f.write(self.docs.tobytes())
+        with open(os.path.join(tmp, "ids.json"), "w") as f:
+            json.dump(self.ids, f)
+        if self.index is not None:
+            self.index.save(os.path.join(tmp, "ivf.npz"))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, directory, name):
+        path = os.path.join(directory, name)
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        scales_path = os.path.join(path, "scales.npy")
+        scales = np.load(scales_path) if os.path.exists(scales_path) else None
+        offsets = np.load(os.path.join(path, "offsets.npy"))
+        docs_path = os.path.join(path, "docs.jsonl")
+        if os.path.getsize(docs_path):
+            docs = np.memmap(docs_path, dtype=np.uint8, mode="r")
+        else:
+            docs = np.zeros(0, dtype=np.uint8)
+        with open(os.path.join(path, "ids.json")) as f:
+            ids = json.load(f)
+        index_path = os.path.join(path, "ivf.npz")
+        index = IVFPQIndex.load(index_path) if os.path.exists(index_path) else None
+        return cls(name, vectors, scales, offsets, docs, ids, index)
+
+
+class _Snapshot:
+    """One immutable state of the store: segments plus the rows deleted from each."""
+
+    def __init__(self, name, segments, deleted, locations=None):
+        self.name = name          # state file name, None in memory or when empty
+        self.segments = segments
+        self.deleted = deleted    # per segment: sorted int64 array of tombstoned rows
+        self._locations = locations
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(s) for s in self.segments) - sum(len(d) for d in self.deleted)
+
+    @property
+    def dims(self):
+        return self.segments[0].vectors.shape[1] if self.segments else None
+
+    def live_rows(self, position):
+        return np.setdiff1d(np.arange(len(self.segments[position])), self.deleted[position])
+
+    def locations(self):
+        """id -> (segment position, row) for every live row, built on first use."""
+        with self._lock:
+            if self._locations is None:
+                locations = {}
+                for position, segment in enumerate(self.segments):
+                    for row in self.live_rows(position).tolist():
+                        locations[segment.ids[row]] = (position, row)
+                self._locations = locations
+            return self._locations
+
+
+_EMPTY = _Snapshot(None, [], [])
+
+
+class NumpyVectorStore:
+    def __init__(self, embedding_function, directory=None, quantize=False,
+                 index="exact", nprobe=NPROBE, rerank=RERANK):
+        """directory=None keeps everything in memory (e.g. one session's uploads).
+
+        A missing directory opens as an empty store and is only created by the
+        first write. index="ivfpq" switches segments of ann.MIN_ROWS vectors or
+        more to approximate search; nprobe and rerank trade latency for recall.
+        """
+        if index not in ("exact", "ivfpq"):
+            raise ValueError(f"Unknown index type: {index}")
+        self._embedding = embedding_function
+        self.directory = directory
+        self.quantize = quantize
+        self.index = index
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self._write_lock = threading.Lock()
+        self._snapshot = _EMPTY
+        self._loaded = None  # (CURRENT mtime, state name) we last loaded
+        if directory:
+            self._refresh()
+
+    @classmethod
+    def from_documents(cls, documents, embedding, ids=None, directory=None, **kwargs):
+        store = cls(embedding, directory=directory, **kwargs)
+        store.add_documents(documents, ids=ids)
+        return store
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def __len__(self):
+        return len(self._current())
+
+    # --- Reading ---
+    def _current(self):
+        if self.directory:
+            self._refresh()
+        return self._snapshot
+
+    def _refresh(self):
+        # One stat per query: picks up states written by other processes
+        pointer = os.path.join(self.directory, "CURRENT")
+        try:
+            mtime = os.stat(pointer).st_mtime_ns
+            if self._loaded and self._loaded[0] == mtime:
+                return
+            with open(pointer) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return
+        if self._loaded and self._loaded[1] == name:
+            self._loaded = (mtime, name)
+            return
+        self._snapshot = self._open(name)
+        self._loaded = (mtime, name)
+
+    def _open(self, name):
+        if os.path.isdir(os.path.join(self.directory, name)):
+            # Pre-segment layout: one generation directory, nothing deleted
+            state = {"segments": [{"name": name, "deleted": []}]}
+        else:
+            with open(os.path.join(self.directory, name + ".json")) as f:
+                state = json.load(f)
+        # Segments are immutable, so ones we already have open are reused
+        opened = {s.name: s for s in self._snapshot.segments}
+        segments, deleted = [], []
+        for entry in state["segments"]:
+            segments.append(opened.get(entry["name"]) or _Segment.load(self.directory, entry["name"]))
+            deleted.append(np.asarray(sorted(entry["deleted"]), dtype=np.int64))
+        return _Snapshot(name, segments, deleted)
+
+    def _scores(self, segment, query, rows=None):
+        if rows is not None:
+            # Exact rescoring of ANN candidates (sorted rows read the mmap in order)
+            return segment.dense(rows) @ query
+        if segment.scales is None:
+            return segment.vectors @ query
+        scores = np.empty(len(segment), dtype=np.float32)
+        for start in range(0, len(segment), QUANTIZED_BLOCK):
+            stop = start + QUANTIZED_BLOCK
+            block = segment.vectors[start:stop].astype(np.float32)
+            scores[start:stop] = (block @ query) * segment.scales[start:stop]
+        return scores
+
+    @staticmethod
+    def _document(segment, row):
+        record = json.loads(segment.record(row))
+        return Document(page_content=record["text"], metadata=record["metadata"])
+
+    def search_by_vector(self, embedding, k=4):
+        """[(chunk id, Document, cosine similarity)], best first."""
+        snapshot = self._current()
+        if not len(snapshot) or k <= 0:
+            return []
+        query = _normalize(embedding)
+        if query.shape != (snapshot.dims,):
+            raise ValueError(f"Query has {query.size} dimensions, the store has {snapshot.dims}")
+
+        hits = []  # (score, segment position, row)
+        for position, (segment, dead) in enumerate(zip(snapshot.segments, snapshot.deleted)):
+            rows = None
+            if segment.index is not None:
+                rows = np.sort(segment.index.search(query, k * self.rerank, self.nprobe))
+                if not len(rows):
+                    continue
+            if not len(segment):
+                continue
+            scores = np.array(self._scores(segment, query, rows), dtype=np.float32)
+            if len(dead):
+                scores[dead if rows is None else np.isin(rows, dead)] = -np.inf
+            top = min(k, len(scores))
+            for i in np.argpartition(-scores, top - 1)[:top]:
+                if np.isfinite(scores[i]):
+                    row = rows[i] if rows is not None else i
+                    hits.append((float(scores[i]), position, int(row)))
+
+        hits.sort(key=lambda hit: -hit[0])
+        return [(snapshot.segments[position].ids[row],
+                 self._document(snapshot.segments[position], row), score)
+                for score, position, row in hits[:k]]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4):
+        """[(Document, cosine similarity)], best first."""
+        return [(doc, score) for _, doc, score in self.search_by_vector(embedding, k)]
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def get_documents(self, ids=None):
+        """[(chunk id, Document)] for the given ids that exist, or for every row."""
+        snapshot = self._current()
+        if ids is None:
+            return [(segment.ids[row], self._document(segment, row))
+                    for position, segment in enumerate(snapshot.segments)
+                    for row in snapshot.live_rows(position).tolist()]
+        locations = snapshot.locations()
+        return [(i, self._document(snapshot.segments[locations[i][0]], locations[i][1]))
+                for i in ids if i in locations]
+
+    def existing_ids(self, ids):
+        """The subset of `ids` stored here."""
+        locations = self._current().locations()
+        return [i for i in ids if i in locations]
+
+    # --- Writing ---
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        vectors = self._embedding.embed_documents(texts) if texts else []
+        self.upsert_vectors(ids, vectors, texts, metadatas or [{}] * len(texts))
+        return ids
+
+    def add_documents(self, documents, ids=None, **kwargs):
+        return self.add_texts([d.page_content for d in documents],
+                              [d.metadata for d in documents], ids=ids)
+
+    def upsert_vectors(self, ids, vectors, texts, metadatas):
+        """Adds precomputed vectors; rows with an existing id are replaced."""
+        if not len(ids):
+            return
+        # Last write wins for duplicate ids inside one batch
+        latest = {chunk_id: row for row, chunk_id in enumerate(ids)}
+        rows = sorted(latest.values())
+        ids = [ids[r] for r in rows]
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32)[rows])
+        records = [_record(texts[r], metadatas[r]) for r in rows]
+
+        with self._write_lock:
+            snapshot = self._current()
+            if snapshot.dims is not None and vectors.shape[1] != snapshot.dims:
+                raise ValueError(f"Vectors have {vectors.shape[1]} dimensions, "
+                                 f"the store has {snapshot.dims}")
+            locations = snapshot.locations()
+            dead = [locations[i] for i in ids if i in locations]
+            self._commit(snapshot, dead, ids, vectors, records)
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return
+        with self._write_lock:
+            snapshot = self._current()
+            locations = snapshot.locations()
+            dead = [locations[i] for i in set(ids) if i in locations]
+            if dead:
+                self._commit(snapshot, dead)
+
+    def update_metadata(self, ids, metadatas):
+        """Re-appends rows whose metadata changed: same text, same vector, no embedding call."""
+        with self._write_lock:
+            snapshot = self._current()
+            locations = snapshot.locations()
+            dead, new_ids, vectors, records = [], [], [], []
+            for chunk_id, metadata in dict(zip(ids, metadatas)).items():
+                if chunk_id not in locations:
+                    continue
+                position, row = locations[chunk_id]
+                segment = snapshot.segments[position]
+                record = json.loads(segment.record(row))
+                if record["metadata"] == (metadata or {}):
+                    continue
+                dead.append((position, row))
+                new_ids.append(chunk_id)
+                vectors.append(segment.dense([row])[0])
+                records.append(_record(record["text"], metadata))
+            if dead:
+                self._commit(snapshot, dead, new_ids, np.asarray(vectors), records)
+
+    def _segment_index(self, snapshot, vectors, base=None, base_rows=None):
+        """IVF-PQ index for a new segment, or None when it is small or exact search is on.
+
+        Reuses a trained coarse quantizer and codebooks when it can: the
+        first merged segment's codes are kept and the other rows encoded, or
+        the store's largest index encodes a fresh segment. Training only
+        happens once a segment outgrows what its template was trained on.
+        """
+        if self.index != "ivfpq" or len(vectors) < MIN_ROWS:
+            return None
+        if base is not None and base.index is not None:
+            template = base.index
+        else:
+            indexed = [s.index for s in snapshot.segments if s.index is not None]
+            template = max(indexed, key=len) if indexed else None
+            base, base_rows = None, None
+        if template is None or template.needs_retrain(len(vectors)):
+            return IVFPQIndex.train(vectors)
+        if base is None:
+            return template.subset(_NO_ROWS).extended(vectors)
+        return template.subset(base_rows).extended(vectors[len(base_rows):])
+
+    def _commit(self, snapshot, dead, new_ids=(), new_vectors=None, new_records=()):
+        """Next state: tombstone `dead` [(segment position, row)], append the new rows.
+
+        Caller holds the write lock.
+        """
+        segments = list(snapshot.segments)
+        deleted = [set(d.tolist()) for d in snapshot.deleted]
+        locations = dict(snapshot.locations())
+        for position, row in dead:
+            deleted[position].add(row)
+            locations.pop(segments[position].ids[row], None)
+
+        # 1. Pick the segments to rewrite: all of them once tombstones pile up,
+        #    else the tail, binary-counter style (the new rows count as the last one)
+        live = [len(s) - len(d) for s, d in zip(segments, deleted)]
+        if len(new_ids):
+            live.append(len(new_ids))
+        tombstones = sum(len(d) for d in deleted)
+        compact = tombstones > COMPACT_DELETED * (sum(len(s) for s in segments) + len(new_ids))
+        start = 0 if compact else len(live) - 1
+        while start > 0 and live[start - 1] <= sum(live[start:]):
+            start -= 1
+
+        fresh = None  # at most one segment per commit is new
+        if compact or start < len(live) - 1:
+            parts = [(segments[p], np.setdiff1d(np.arange(len(segments[p])), sorted(deleted[p])))
+                     for p in range(start, len(segments))]
+            vectors = [s.dense(rows) for s, rows in parts if len(rows)]
+            records = [s.record(row) for s, rows in parts for row in rows.tolist()]
+            ids = [s.ids[row] for s, rows in parts for row in rows.tolist()]
+            if len(new_ids):
+                vectors.append(new_vectors)
+                records.extend(new_records)
+                ids.extend(new_ids)
+            segments, deleted = segments[:start], deleted[:start]
+            if ids:
+                vectors = np.concatenate(vectors)
+                base, base_rows = parts[0] if parts else (None, None)
+                fresh = _Segment.build(vectors, records, ids, self.quantize,
+                                       self._segment_index(snapshot, vectors, base, base_rows))
+        elif len(new_ids):
+            fresh = _Segment.build(new_vectors, new_records, new_ids, self.quantize,
+                                   self._segment_index(snapshot, new_vectors))
+        if fresh is not None:
+            segments.append(fresh)
+            deleted.append(set())
+            for row, chunk_id in enumerate(fresh.ids):
+                locations[chunk_id] = (len(segments) - 1, row)
+
+        deleted = [np.asarray(sorted(d), dtype=np.int64) for d in deleted]
+        if not self.directory:
+            self._snapshot = _Snapshot(None, segments, deleted, locations)
+            return
+
+        # 2. Write the new segment and state next to the live ones, then flip CURRENT
+        os.makedirs(self.directory, exist_ok=True)
+        previous = self._loaded[1] if self._loaded else None
+        number = int(previous[1:7]) + 1 if previous else 1
+        if fresh is not None:
+            fresh.save(self.directory, f"s{number:06d}")
+            segments[-1] = _Segment.load(self.directory, f"s{number:06d}")
+        state = f"v{number:06d}"
+        with open(os.path.join(self.directory, state + ".json.tmp"), "w") as f:
+            json.dump({"segments": [{"name": s.name, "deleted": d.tolist()}
+                                    for s, d in zip(segments, deleted)]}, f)
+        os.replace(os.path.join(self.directory, state + ".json.tmp"),
+                   os.path.join(self.directory, state + ".json"))
+
+        pointer = os.path.join(self.directory, "CURRENT")
+        with open(pointer + ".tmp", "w") as f:
+            f.write(state)
+        os.replace(pointer + ".tmp", pointer)
+        self._snapshot = _Snapshot(state, segments, deleted, locations)
+        self._loaded = (os.stat(pointer).st_mtime_ns, state)
+
+        # Keep what the previous state uses for readers that are mid-load; drop the rest
+        keep = {s.name for s in segments} | {s.name for s in snapshot.segments}
+        keep |= {state + ".json", f"{previous}.json", previous, "CURRENT"}
+        for name in os.listdir(self.directory):
+            if ".tmp" not in name and name not in keep and name[:1] in "gsv":
+                path = os.path.join(self.directory, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
@@ -0,0 +1,30 @@
+from omni.bm25 import BM25Index
+
+
+def ids_for(index, query, k=10):
+    return [chunk_id for chunk_id, _ in index.search(query, k)]
+
+
+def test_add_remove_save_load(tmp_path):
+    index = BM25Index()
+    index.add(["a", "b", "c"], ["forklift safety checklist",
+                               "closing procedure for the register",
+                               "forklift battery charging"])
+    assert ids_for(index, "forklift")[0] in {"a", "c"}
+    assert set(ids_for(index, "forklift")) == {"a", "c"}
+
+    index.remove(["a"])
+    assert "a" not in index
+    assert ids_for(index, "forklift") == ["c"]
+
+    path = str(tmp_path / "kb.bm25.npz")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert len(loaded) == 2
+    assert ids_for(loaded, "forklift") == ["c"]
+    assert ids_for(loaded, "closing register") == ["b"]
+
+    # A loaded index keeps taking incremental updates
+    loaded.add(["d", "b"], ["forklift inspection", "opening procedure"])
+    assert set(ids_for(loaded, "forklift")) == {"c", "d"}
+    assert ids_for(loaded, "closing") == []
@@ -0,0 +1,26 @@
+from langchain_core.documents import Document
+
+from omni.context import pack_context
+
+BEST = "BEST " + "important fact number one. " * 40
+LOWER = "Lower ranked intro text. " * 40 + BEST[:60]
+
+
+def docs():
+    # The lower-ranked chunk overlaps the start of the best one, so it is
+    # stitched in front of it
+    return [Document(page_content=BEST, metadata={"source": "a.pdf", "page": 1}),
+            Document(page_content=LOWER, metadata={"source": "a.pdf", "page": 1})]
+
+
+def test_trim_keeps_the_best_chunk():
+    context, stats = pack_context(docs(), budget=300)
+    assert BEST.strip() in context
+    assert stats["merged"] == 1
+    assert stats["used"] == 1
+
+
+def test_used_counts_chunks_not_pieces():
+    context, stats = pack_context(docs(), budget=5000)
+    assert context.startswith("Lower ranked")
+    assert stats["used"] == 2
@@ -0,0 +1,22 @@
+import pytest
+
+from omni.context_cache import LocalCaches, get_or_create
+
+
+def test_local_caches_create_get_delete():
+    caches = LocalCaches()
+    cache, reused = get_or_create(caches, "gemini-2.5-flash", "the corpus")
+    assert not reused
+    assert cache.system_instruction == "the corpus"
+    assert caches.get(cache.name) is cache
+
+    caches.delete(cache.name)
+    with pytest.raises(KeyError):
+        caches.get(cache.name)
+
+
+def test_local_caches_are_not_registered(tmp_path):
+    registry = tmp_path / "caches.json"
+    get_or_create(LocalCaches(), "gemini-2.5-flash", "the corpus", registry=str(registry))
+    # A local stand-in dies with the process, so a rerun must not try to reuse it
+    assert not registry.exists()
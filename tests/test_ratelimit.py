@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+from omni.embeddings import RateLimitedEmbeddings
+from omni.ratelimit import Throttled, TokenBucketLimiter
+from omni.retry import RetryScheduler
+
+
+def test_acquire_gives_up_after_max_wait():
+    limiter = TokenBucketLimiter(rpm=1, tpm=1000)
+    limiter.acquire(max_wait=0)
+
+    start = time.time()
+    with pytest.raises(Throttled) as raised:
+        limiter.acquire(max_wait=0.1)
+    assert time.time() - start < 1
+    assert raised.value.remaining > 0
+
+
+class FakeEmbeddings:
+    def embed_documents(self, texts):
+        return [[1.0, 0.0] for _ in texts]
+
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+
+def test_embeddings_respect_max_wait():
+    embeddings = RateLimitedEmbeddings(FakeEmbeddings(), limiter=TokenBucketLimiter(rpm=1, tpm=1000),
+                                       max_wait=0)
+    assert embeddings.embed_query("first") == [1.0, 0.0]
+    with pytest.raises(Throttled):
+        embeddings.embed_documents(["second"])
+
+
+def test_throttled_does_not_extend_the_shared_cooldown():
+    scheduler = RetryScheduler()
+    delay = scheduler.delay_for(0, Throttled(3.0))
+    assert delay >= 3.0
+    assert scheduler.cooldown_remaining() == 0
@@ -0,0 +1,20 @@
+from omni.screening import parse_scores
+
+
+def test_parse_scores_ignores_echoed_local_score():
+    report = """
+### 1. 🤖 Authenticity Check (THE MOST IMPORTANT SECTION)
+The local detector reported:
+* Local Human Score: 40% (Hybrid)
+* **Human Score:** 85% - specific numbers and plain wording.
+* **Verdict:** Authentic Professional
+
+### 2. 🎯 Match Score
+* **Score:** 72%
+* **Summary:** Gets the interview.
+"""
+    assert parse_scores(report) == (85, 72)
+
+
+def test_parse_scores_missing_labels():
+    assert parse_scores("* Local Human Score: 40% (Hybrid)") == (None, None)
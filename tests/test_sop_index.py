@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from omni import sop_index
+
+
+@pytest.fixture
+def persist_dir(tmp_path, monkeypatch):
+    # Fresh handle caches per test; precomputed vectors need no embedding client
+    monkeypatch.setattr(sop_index, "_collections", {})
+    monkeypatch.setattr(sop_index, "_clients", {})
+    monkeypatch.setattr(sop_index, "get_embeddings", lambda api_key: None)
+    return str(tmp_path)
+
+
+def legacy_build(persist_dir, name="langchain"):
+    """A baseline build_db collection: Chroma, LangChain uuid ids, no manifest."""
+    chromadb = pytest.importorskip("chromadb")
+    collection = chromadb.PersistentClient(path=persist_dir).create_collection(name)
+    collection.add(ids=["uuid-1", "uuid-2"], embeddings=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]],
+                   documents=["first passage", "second passage"],
+                   metadatas=[{"source": "a.pdf", "page": 0}] * 2)
+
+
+def test_rebuild_over_legacy_build_does_not_duplicate(persist_dir):
+    legacy_build(persist_dir)
+    db, manifest = sop_index.open_for_build("langchain", "key", persist_dir)
+    assert manifest == {"version": 0, "files": {}}
+    assert len(db) == 0
+
+    sop_index.store_vectors(db, ["hash-1", "hash-2"], np.eye(3, dtype=np.float32)[:2],
+                            ["first passage", "second passage"],
+                            [{"source": "a.pdf", "page": 0}] * 2)
+    sop_index._collections.clear()
+    reopened = sop_index.open_collection("langchain", "key", persist_dir)
+    assert sorted(chunk_id for chunk_id, _ in reopened.get_documents()) == ["hash-1", "hash-2"]
+
+
+def test_resumed_build_keeps_its_rows(persist_dir):
+    db = sop_index.open_collection("langchain", "key", persist_dir)
+    sop_index.store_vectors(db, ["hash-1"], np.eye(3, dtype=np.float32)[:1],
+                            ["first passage"], [{}])
+    sop_index._collections.clear()
+    db, _ = sop_index.open_for_build("langchain", "key", persist_dir, resume=True)
+    assert db.existing_ids(["hash-1"]) == ["hash-1"]
+
+
+def test_legacy_build_with_manifest_is_migrated(persist_dir):
+    legacy_build(persist_dir)
+    sop_index.save_manifest("langchain", {"version": 1, "files": {}}, persist_dir)
+    db, manifest = sop_index.open_for_build("langchain", "key", persist_dir)
+    assert manifest["version"] == 1
+    assert len(db) == 2
+
+
+class NoSplit:
+    def split_documents(self, pages):
+        return []
+
+
+def test_unreadable_changed_file_keeps_its_chunks(persist_dir):
+    db = sop_index.open_collection("sop", "key", persist_dir)
+    sop_index.store_vectors(db, ["old-1"], np.eye(3, dtype=np.float32)[:1], ["old text"],
+                            [{"source": "a.pdf", "page": 0}])
+    entry = {"sha256": "old-hash", "chunks": ["old-1"]}
+    sop_index.save_manifest("sop", {"version": 1, "files": {"a.pdf": entry}}, persist_dir)
+
+    failures = []
+    stats = sop_index.upsert_sources("sop", [("a.pdf", b"not a pdf")], NoSplit(), "key",
+                                     persist_dir=persist_dir,
+                                     on_progress=lambda name, pages, error: failures.append(name))
+    assert failures == ["a.pdf"]
+    assert stats["files_failed"] == 1
+    assert stats["chunks_deleted"] == 0
+    assert db.existing_ids(["old-1"]) == ["old-1"]
+    # The old hash stays, so the next run retries the file
+    assert sop_index.load_manifest("sop", persist_dir)["files"]["a.pdf"] == entry
@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pytest
+
+from omni.vectorstore import NumpyVectorStore
+
+
+def vectors(count, dims=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dims)).astype(np.float32)
+
+
+def upsert(store, ids, rows):
+    store.upsert_vectors(ids, rows, [f"text {i}" for i in ids], [{"id": i} for i in ids])
+
+
+def nearest(store, vector, k=1):
+    return [chunk_id for chunk_id, _, _ in store.search_by_vector(vector, k)]
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_upsert_delete_reopen(tmp_path, quantize):
+    directory = str(tmp_path / "kb.npvec")
+    store = NumpyVectorStore(None, directory=directory, quantize=quantize)
+    rows = vectors(30)
+    for start in range(0, 30, 10):
+        upsert(store, [str(i) for i in range(start, start + 10)], rows[start:start + 10])
+    assert len(store) == 30
+    assert nearest(store, rows[7]) == ["7"]
+
+    # Replacing an id moves it; deleting one hides it
+    upsert(store, ["7"], rows[20:21])
+    store.delete(ids=["3"])
+    assert len(store) == 29
+    assert nearest(store, rows[3], k=30).count("3") == 0
+    assert set(nearest(store, rows[20], k=2)) == {"7", "20"}
+
+    reopened = NumpyVectorStore(None, directory=directory, quantize=quantize)
+    assert len(reopened) == 29
+    assert reopened.existing_ids(["3", "7", "29"]) == ["7", "29"]
+    docs = dict(reopened.get_documents(["7"]))
+    assert docs["7"].page_content == "text 7"
+    assert nearest(reopened, rows[12]) == ["12"]
+
+
+def test_update_metadata_survives_reopen(tmp_path):
+    directory = str(tmp_path / "kb.npvec")
+    store = NumpyVectorStore(None, directory=directory)
+    rows = vectors(5)
+    upsert(store, list("abcde"), rows)
+    store.update_metadata(["b"], [{"page": 9}])
+
+    reopened = NumpyVectorStore(None, directory=directory)
+    assert dict(reopened.get_documents(["b"]))["b"].metadata == {"page": 9}
+    assert nearest(reopened, rows[1]) == ["b"]
+
+
+def test_opening_a_missing_store_creates_nothing(tmp_path):
+    directory = str(tmp_path / "missing.npvec")
+    store = NumpyVectorStore(None, directory=directory)
+    assert len(store) == 0
+    assert store.search_by_vector(vectors(1)[0], 3) == []
+    assert not os.path.exists(directory)
+
+
+def test_small_batches_stay_few_segments(tmp_path):
+    store = NumpyVectorStore(None, directory=str(tmp_path / "kb.npvec"))
+    rows = vectors(640)
+    for start in range(0, 640, 10):
+        upsert(store, [str(i) for i in range(start, start + 10)], rows[start:start + 10])
+    # Binary-counter merges: about log2(64 batches) segments, not one per batch
+    assert len(store._snapshot.segments) <= 7
+    assert len(store) == 640
+    assert nearest(store, rows[333]) == ["333"]